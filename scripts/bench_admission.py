@@ -0,0 +1,78 @@
+# scripts/bench_admission.py
+# Compare tx admission throughput: one mempool.add per tx (signature checked
+# inline, as /sendtx did) against AdmissionPipeline's batched verification
+# with 1..N signature workers. Many client threads submit concurrently.
+import sys
+import os
+import time
+import base64
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.hazmat.primitives import serialization
+from tally.ledger import Ledger
+from tally.mempool import Mempool
+from tally.admission import AdmissionPipeline
+from tally.transaction import Transaction, sig_cache
+from tally.amount import to_atoms
+
+def make_txs(senders):
+    # One tx per sender: concurrent clients may reorder submissions, which
+    # would turn a sender's later nonces into gaps
+    txs = []
+    for s in range(senders):
+        priv = ec.generate_private_key(ec.SECP256R1())
+        der = priv.public_key().public_bytes(serialization.Encoding.DER, serialization.PublicFormat.SubjectPublicKeyInfo)
+        tx = Transaction(f'sender{s}', 'sink', to_atoms(1), 0, public_key=base64.b64encode(der).decode())
+        tx.sign(priv)
+        txs.append(tx.freeze())
+    return txs
+
+def fresh_mempool(senders):
+    # Empty the process-wide cache (ledger and admission both hold it) so
+    # every variant pays for its own signature checks
+    sig_cache.clear()
+    ledger = Ledger({'sink': 0, **{f'sender{s}': to_atoms(1000) for s in range(senders)}})
+    return Mempool(ledger)
+
+def run(txs, senders, clients, submit_for):
+    mempool = fresh_mempool(senders)
+    submit, close = submit_for(mempool)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(clients) as pool:
+        accepted = sum(pool.map(submit, txs))
+    elapsed = time.perf_counter() - start
+    close()
+    assert accepted == len(txs), f"only {accepted}/{len(txs)} admitted"
+    assert sig_cache.misses == len(txs) if submit_for is inline else sig_cache.hits == len(txs)
+    return len(txs) / elapsed
+
+def inline(mempool):
+    lock = threading.Lock()
+    def submit(tx):
+        with lock:
+            return mempool.add(tx)
+    return submit, lambda: None
+
+def batched(workers):
+    def submit_for(mempool):
+        p = AdmissionPipeline(mempool, threading.RLock(), workers=workers)
+        return p.submit, p.close
+    return submit_for
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark mempool admission throughput.")
+    parser.add_argument('--senders', type=int, default=4000, help='Txs to admit, one per sender (default: 4000)')
+    parser.add_argument('--clients', type=int, default=64, help='Concurrent submitting threads (default: 64)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Most signature workers to try')
+    args = parser.parse_args()
+    txs = make_txs(args.senders)
+    baseline = run(txs, args.senders, args.clients, inline)
+    print(f"{'inline':>12}: {baseline:10,.0f} tx/s")
+    workers = 1
+    while workers <= args.workers:
+        r = run(txs, args.senders, args.clients, batched(workers))
+        print(f"{f'{workers} workers':>12}: {r:10,.0f} tx/s  ({r / baseline:.2f}x inline)")
+        workers *= 2
@@ -0,0 +1,41 @@
+# scripts/bench_pow.py
+# Compare PoW hashes/sec: the old JSON header, the full binary preimage per
+# nonce (Block.compute_hash) and the midstate loop used by mine_block.
+import sys
+import os
+import time
+import json
+import hashlib
+import argparse
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from tally.blockchain import Block, search_nonce
+
+def json_header_loop(block, n):
+    header = block.header()
+    for nonce in range(n):
+        header['nonce'] = nonce
+        hashlib.sha256(json.dumps(header, sort_keys=True).encode()).hexdigest()
+
+def compute_hash_loop(block, n):
+    for nonce in range(n):
+        block.nonce = nonce
+        block.compute_hash()
+
+def midstate_loop(block, n):
+    # difficulty 64 never matches, so every nonce in the range is tried
+    search_nonce(block.header_prefix(), 64, 0, n)
+
+def rate(fn, block, n):
+    start = time.perf_counter()
+    fn(block, n)
+    return n / (time.perf_counter() - start)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the proof-of-work inner loop.")
+    parser.add_argument('--hashes', type=int, default=500000, help='Nonces to try per variant (default: 500000)')
+    args = parser.parse_args()
+    block = Block(1, '0' * 64, [], 1710000001, 0)
+    baseline = rate(compute_hash_loop, block, args.hashes)
+    for name, fn in [('json header', json_header_loop), ('compute_hash', compute_hash_loop), ('midstate', midstate_loop)]:
+        r = baseline if fn is compute_hash_loop else rate(fn, block, args.hashes)
+        print(f"{name:>14}: {r:12,.0f} H/s  ({r / baseline:.2f}x compute_hash)")
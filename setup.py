@@ -22,6 +22,7 @@ setup(
     entry_points={
         'console_scripts': [
             'tally_wallet = tally_wallet.cli:cli',  # Create a command-line entry point
+            'tally-miner = tally.miner_cli:main',  # External PoW worker (getwork/submitwork)
         ],
     },
 )
\ No newline at end of file
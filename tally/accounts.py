@@ -0,0 +1,297 @@
+# tally/accounts.py
+from array import array
+from collections.abc import MutableMapping
+import heapq
+
+_EMPTY = 0  # index slots hold account id + 1, so 0 marks a free slot
+
+def _hash32(addr):
+    # Low 32 bits of the str hash, as a signed int so it fits array('i')
+    h = hash(addr) & 0xffffffff
+    return h - (1 << 32) if h >= 1 << 31 else h
+
+class AccountTable:
+    """
+    Compact account store. Each address is interned once to an integer ID;
+    the address bytes live in one shared blob and balance/nonce/stake are
+    fixed-width u64 columns indexed by ID. Lookups go through an
+    open-addressing hash index instead of a dict of str keys, which keeps the
+    per-account cost to a few dozen bytes instead of several hundred.
+    IDs are assigned in interning order; only drop() renumbers rows.
+
+    A table can sit on top of a read-only base (a snapshot.Snapshot): base
+    accounts are interned the first time they are looked up, and anything
+    that iterates the whole table calls materialize() first. Base accounts
+    removed by drop() (a rollback past the snapshot) are remembered so they
+    are not loaded again.
+    """
+    COLUMNS = ('balance', 'nonce', 'stake')
+
+    def __init__(self):
+        self._blob = bytearray()        # concatenated utf-8 addresses
+        self._offsets = array('Q', [0])  # address i is _blob[_offsets[i]:_offsets[i+1]]
+        self._hashes = array('i')       # 32-bit address hash per ID, reused on resize
+        self._index = array('i', [_EMPTY]) * 8
+        self.balance = array('Q')
+        self.nonce = array('Q')
+        self.stake = array('Q')
+        self.base = None
+        self._materialized = False
+        self._dropped = set()  # base addresses removed since the snapshot
+
+    def __len__(self):
+        return len(self._hashes)
+
+    def address(self, i):
+        return self._blob[self._offsets[i]:self._offsets[i + 1]].decode()
+
+    def addresses(self):
+        self.materialize()
+        return (self.address(i) for i in range(len(self)))
+
+    def lookup(self, addr):
+        """ID of addr, or None if the account does not exist."""
+        i = self._probe(addr)
+        if i is None and self.base is not None and not self._materialized and addr not in self._dropped:
+            j = self.base.find(addr)
+            if j is not None:
+                i = self._append(addr)
+                self.balance[i], self.nonce[i], self.stake[i] = self.base.account(j)
+        return i
+
+    def _probe(self, addr):
+        h = _hash32(addr)
+        mask = len(self._index) - 1
+        slot = h & mask
+        raw = None
+        while True:
+            entry = self._index[slot]
+            if entry == _EMPTY:
+                return None
+            i = entry - 1
+            if self._hashes[i] == h:
+                if raw is None:
+                    raw = addr.encode()
+                if self._blob[self._offsets[i]:self._offsets[i + 1]] == raw:
+                    return i
+            slot = (slot + 1) & mask
+
+    def intern(self, addr):
+        """ID of addr, creating a zeroed account if needed."""
+        i = self.lookup(addr)
+        return self._append(addr) if i is None else i
+
+    def _append(self, addr):
+        i = len(self)
+        h = _hash32(addr)
+        self._blob += addr.encode()
+        self._offsets.append(len(self._blob))
+        self._hashes.append(h)
+        for col in self.COLUMNS:
+            getattr(self, col).append(0)
+        if 2 * len(self) > len(self._index):  # keep load factor <= 1/2
+            self._rebuild_index(2 * len(self._index))
+        else:
+            self._insert(i, h)
+        return i
+
+    def _insert(self, i, h):
+        mask = len(self._index) - 1
+        slot = h & mask
+        while self._index[slot] != _EMPTY:
+            slot = (slot + 1) & mask
+        self._index[slot] = i + 1
+
+    def _rebuild_index(self, size):
+        self._index = array('i', [_EMPTY]) * size
+        for i, h in enumerate(self._hashes):
+            self._insert(i, h)
+
+    def truncate(self, n):
+        """Drop accounts with ID >= n (the most recently created ones)."""
+        if n >= len(self):
+            return
+        del self._blob[self._offsets[n]:]
+        del self._offsets[n + 1:]
+        del self._hashes[n:]
+        for col in self.COLUMNS:
+            del getattr(self, col)[n:]
+        self._rebuild_index(len(self._index))
+        self._materialized = False  # dropped rows may still be in the base
+
+    def drop(self, addrs):
+        """
+        Remove the given accounts. Usually they are the newest rows and this
+        is a truncate; rows interned after them (base accounts loaded later)
+        are re-appended with new IDs.
+        """
+        if self.base is not None:
+            self._dropped.update(addrs)
+        ids = {i for i in map(self._probe, addrs) if i is not None}
+        if not ids:
+            return
+        first = min(ids)
+        keep = [(self.address(i), self.balance[i], self.nonce[i], self.stake[i])
+                for i in range(first, len(self)) if i not in ids]
+        self.truncate(first)
+        for addr, balance, nonce, stake in keep:
+            i = self._append(addr)
+            self.balance[i], self.nonce[i], self.stake[i] = balance, nonce, stake
+
+    def materialize(self):
+        """Intern every base account not loaded yet, so the table is complete."""
+        if self.base is None or self._materialized:
+            return
+        base = self.base
+        cols = [base.column(c) for c in range(len(self.COLUMNS))]
+        for j in range(base.count):
+            addr = base.address(j)
+            if self._probe(addr) is None and addr not in self._dropped:
+                i = self._append(addr)
+                self.balance[i], self.nonce[i], self.stake[i] = cols[0][j], cols[1][j], cols[2][j]
+        self._materialized = True
+
+    def copy(self):
+        new = AccountTable.__new__(AccountTable)
+        new._blob = bytearray(self._blob)
+        for name in ('_offsets', '_hashes', '_index') + self.COLUMNS:
+            setattr(new, name, array(getattr(self, name).typecode, getattr(self, name)))
+        new.base = self.base  # read-only, safe to share
+        new._materialized = self._materialized
+        new._dropped = set(self._dropped)
+        return new
+
+    def total(self, column):
+        self.materialize()
+        return sum(getattr(self, column))
+
+    def top(self, column, n):
+        """[(address, value)] for the n largest values of a column."""
+        self.materialize()
+        col = getattr(self, column)
+        return [(self.address(i), col[i]) for i in heapq.nlargest(n, range(len(col)), key=col.__getitem__)]
+
+class ColumnView(MutableMapping):
+    """
+    dict-like view of one AccountTable column keyed by address, so Ledger
+    code can keep using balances[addr]. With sparse=True (stakes) only
+    non-zero entries are visible and deleting an entry zeroes it.
+    """
+    def __init__(self, table, column, sparse=False):
+        self.table = table
+        self.column = column
+        self.sparse = sparse
+
+    def _col(self):
+        return getattr(self.table, self.column)
+
+    def __getitem__(self, addr):
+        i = self.table.lookup(addr)
+        if i is None or (self.sparse and self._col()[i] == 0):
+            raise KeyError(addr)
+        return self._col()[i]
+
+    def __setitem__(self, addr, value):
+        self._col()[self.table.intern(addr)] = value
+
+    def __delitem__(self, addr):
+        if not self.sparse:
+            raise TypeError("Accounts cannot be deleted")
+        i = self.table.lookup(addr)
+        if i is None or self._col()[i] == 0:
+            raise KeyError(addr)
+        self._col()[i] = 0
+
+    def __contains__(self, addr):
+        i = self.table.lookup(addr)
+        return i is not None and not (self.sparse and self._col()[i] == 0)
+
+    def __iter__(self):
+        self.table.materialize()
+        col = self._col()
+        for i in range(len(self.table)):
+            if not self.sparse or col[i]:
+                yield self.table.address(i)
+
+    def __len__(self):
+        self.table.materialize()
+        if self.sparse:
+            return sum(1 for v in self._col() if v)
+        return len(self.table)
+
+    def values(self):
+        # Fast path for sum(ledger.balances.values()) and friends
+        self.table.materialize()
+        if self.sparse:
+            return [v for v in self._col() if v]
+        return self._col()
+
+    def copy(self):
+        return dict(self.items())
+
+class KeyRegistry(MutableMapping):
+    """
+    address -> base64 DER public key, recorded the first time an address
+    signs a tx. Over a snapshot base, keys are read from it on first use;
+    base keys deleted by a rollback are tombstoned in `removed`.
+    """
+    def __init__(self, base=None):
+        self.local = {}
+        self.base = base
+        self.removed = set()
+
+    def __getitem__(self, addr):
+        if addr in self.removed:
+            raise KeyError(addr)
+        try:
+            return self.local[addr]
+        except KeyError:
+            pass
+        if self.base is not None:
+            j = self.base.find(addr)
+            key = self.base.pubkey(j) if j is not None else None
+            if key is not None:
+                self.local[addr] = key
+                return key
+        raise KeyError(addr)
+
+    def __setitem__(self, addr, key):
+        self.removed.discard(addr)
+        self.local[addr] = key
+
+    def __delitem__(self, addr):
+        if addr not in self:
+            raise KeyError(addr)
+        self.local.pop(addr, None)
+        if self.base is not None:
+            self.removed.add(addr)
+
+    def __contains__(self, addr):
+        try:
+            self[addr]
+            return True
+        except KeyError:
+            return False
+
+    def _all(self):
+        keys = dict(self.local)
+        if self.base is not None:
+            for j in range(self.base.count):
+                addr = self.base.address(j)
+                if addr not in keys and addr not in self.removed:
+                    key = self.base.pubkey(j)
+                    if key is not None:
+                        keys[addr] = key
+        return keys
+
+    def __iter__(self):
+        return iter(self._all())
+
+    def __len__(self):
+        return len(self._all())
+
+    def copy(self):
+        new = KeyRegistry(self.base)
+        new.local = dict(self.local)
+        new.removed = set(self.removed)
+        return new
@@ -0,0 +1,164 @@
+# tally/admission.py
+import os, queue, threading, time
+from concurrent.futures import Future, ProcessPoolExecutor
+from .crypto import parse_public_key
+from .transaction import sig_cache, SIG_ALGO
+
+# Signature workers; override with TALLY_VERIFY_WORKERS (0 or 1 = verify on the collector thread)
+VERIFY_WORKERS = int(os.environ.get('TALLY_VERIFY_WORKERS', os.cpu_count() or 1))
+BATCH_SIZE = 64         # txs per batch at most
+BATCH_WAIT = 0.005      # seconds the first tx of a batch waits for company, under sustained load
+PARALLEL_MIN_TXS = 16   # smaller batches are verified on the collector thread
+ADMISSION_TIMEOUT = 2.0  # seconds submit() waits for its tx's verdict
+
+def _verify_chunk(items):
+    """Worker: [(message, signature, b64 DER key)] -> [bool]."""
+    results = []
+    for message, signature, key in items:
+        try:
+            parse_public_key(key).verify(signature, message, SIG_ALGO)
+            results.append(True)
+        except Exception:
+            results.append(False)
+    return results
+
+class AdmissionPipeline:
+    """
+    Micro-batched tx admission. submit() queues a tx and blocks until its
+    verdict; a collector thread gathers up to batch_size txs, checks their
+    signatures across a process pool,
+    records the good ones in sig_cache and then admits the batch into the
+    mempool in arrival order under lock, where the signature check is a
+    cache hit. on_admit(tx) runs for each accepted tx after the lock is
+    released. A batch is cut as soon as the queue is empty, unless the last
+    one filled up: only then does it wait up to max_wait for more txs, so a
+    handful of clients never pay for the wait.
+    """
+    def __init__(self, mempool, lock, on_admit=None, workers=None, batch_size=BATCH_SIZE,
+                 max_wait=BATCH_WAIT, timeout=ADMISSION_TIMEOUT):
+        self.mempool = mempool
+        self.lock = lock
+        self.on_admit = on_admit
+        self.workers = VERIFY_WORKERS if workers is None else workers
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.timeout = timeout
+        self.batches = 0
+        self._busy = False  # last batch was full
+        self._queue = queue.Queue()
+        self._pool = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, tx):
+        """True if tx was admitted; raises TimeoutError if no verdict within timeout (it may still be admitted)."""
+        return self.submit_async(tx).result(self.timeout)
+
+    def submit_async(self, tx):
+        future = Future()
+        self._queue.put((tx, future))
+        return future
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + (self.max_wait if self._busy else 0)
+            while len(batch) < self.batch_size:
+                try:
+                    wait = deadline - time.monotonic()
+                    item = self._queue.get(timeout=wait) if wait > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)  # finish this batch, then stop
+                    break
+                batch.append(item)
+            self._busy = len(batch) >= self.batch_size
+            try:
+                self._process(batch)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _process(self, batch):
+        self.batches += 1
+        txs = [tx for tx, _ in batch]
+        keys = self._keys(txs)
+        encoded = [self._encode(tx) for tx in txs]
+        signed = self._verify(txs, encoded, keys)
+        verdicts = []
+        with self.lock:
+            # Recorded under the lock, like every other sig_cache use on node state
+            for tx, key, ok in zip(txs, keys, signed):
+                if ok:
+                    sig_cache.record(tx, None if tx.public_key else key)
+            for tx, key, message, ok in zip(txs, keys, encoded, signed):
+                if message is None:
+                    print("[!] Reject: Malformed transaction")
+                    verdicts.append(False)
+                    continue
+                if key and not ok:
+                    print("[!] Reject: Invalid signature")
+                    verdicts.append(False)
+                    continue
+                try:
+                    verdicts.append(self.mempool.add(tx))
+                except Exception as e:
+                    verdicts.append(e)
+        for (tx, future), verdict in zip(batch, verdicts):
+            if isinstance(verdict, Exception):
+                future.set_exception(verdict)
+                continue
+            if verdict and self.on_admit:
+                self.on_admit(tx)
+            future.set_result(verdict)
+
+    def _keys(self, txs):
+        # Keyless txs verify against the sender's registered key; None leaves the tx to mempool.add()
+        if all(tx.public_key for tx in txs):
+            return [tx.public_key for tx in txs]
+        pubkeys = self.mempool.pending.ledger.pubkeys
+        keys = []
+        with self.lock:
+            for tx in txs:
+                try:
+                    keys.append(tx.public_key or pubkeys.get(tx.sender_addr))
+                except Exception:
+                    keys.append(None)  # mempool.add() rejects it on its own
+        return keys
+
+    @staticmethod
+    def _encode(tx):
+        # Signed bytes, or None if tx cannot be encoded; only that tx is rejected
+        try:
+            tx.txid()  # covers the signature and key fields as well
+            return tx.message_bytes()
+        except Exception:
+            return None
+
+    def _verify(self, txs, encoded, keys):
+        items = [(message, tx.signature, key) for tx, message, key in zip(txs, encoded, keys)]
+        todo = [i for i, (message, signature, key) in enumerate(items) if message and key and signature]
+        signed = [False] * len(items)
+        if len(todo) < PARALLEL_MIN_TXS or self.workers < 2:
+            results = _verify_chunk([items[i] for i in todo])
+        else:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(self.workers)
+            step = -(-len(todo) // self.workers)
+            chunks = [[items[i] for i in todo[n:n + step]] for n in range(0, len(todo), step)]
+            results = [ok for chunk in self._pool.map(_verify_chunk, chunks) for ok in chunk]
+        for i, ok in zip(todo, results):
+            signed[i] = ok
+        return signed
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
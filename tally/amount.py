@@ -0,0 +1,52 @@
+# tally/amount.py
+# Amounts are stored, summed and encoded as integer "tally-atoms". Decimal and
+# strings only appear at the edges (RPC JSON, CLI, genesis files).
+from decimal import Decimal, InvalidOperation
+
+# One atom is the smallest amount a new account may be funded with (1e-10)
+ATOMS_PER_TALLY = 10**10
+ATOM_DECIMALS = 10
+MAX_ATOMS = 2**64 - 1  # amounts are fixed-width u64 in the binary encoding
+
+def to_atoms(value):
+    """Convert a tally-denominated number or string (e.g. "0.25") to atoms, exactly."""
+    try:
+        d = Decimal(str(value))
+    except InvalidOperation:
+        raise ValueError(f"Invalid amount: {value!r}")
+    if not d.is_finite():
+        raise ValueError(f"Amount {value} is not a whole number of atoms")
+    # Integer arithmetic on the digits: Decimal ops would round past 28 digits
+    sign, digits, exponent = d.as_tuple()
+    n = int(''.join(map(str, digits)))
+    shift = exponent + ATOM_DECIMALS
+    if shift < 0:
+        cut = 10 ** min(-shift, len(digits))  # n < cut when -shift > len(digits)
+        if n % cut:
+            raise ValueError(f"Amount {value} is not a whole number of atoms")
+        n //= cut
+    elif n:
+        if shift + len(digits) > len(str(MAX_ATOMS)):
+            raise ValueError(f"Amount {value} is out of range")
+        n *= 10 ** shift
+    if n > MAX_ATOMS:
+        raise ValueError(f"Amount {value} is out of range")
+    return -n if sign else n
+
+def check_atoms(value, field='amount'):
+    """value if it is an int atom count in 0..MAX_ATOMS; raises otherwise (tally amounts need to_atoms())."""
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise TypeError(f"{field} must be an int number of atoms, got {value!r}; use amount.to_atoms()")
+    if not 0 <= value <= MAX_ATOMS:
+        raise ValueError(f"{field} must be between 0 and {MAX_ATOMS} atoms, got {value}")
+    return value
+
+def format_atoms(atoms):
+    """Exact decimal string for an atom count, without trailing zeros ("0.25")."""
+    sign = '-' if atoms < 0 else ''
+    whole, frac = divmod(abs(atoms), ATOMS_PER_TALLY)
+    frac = f"{frac:0{ATOM_DECIMALS}d}".rstrip('0')
+    return f"{sign}{whole}.{frac}" if frac else f"{sign}{whole}"
+
+def from_atoms(atoms):
+    return Decimal(format_atoms(atoms))
@@ -1,23 +1,100 @@
 # tally/blockchain.py
-import time, json, hashlib
-from .transaction import Transaction
+import time, hashlib, struct
+from .transaction import Freezable, tx_from_bytes, tx_from_dict
+from . import codec
+from .statetree import EMPTY_ROOT
 from .ledger import Ledger
 
 DIFFICULTY = 3
+MAX_BLOCK_BYTES = 1_000_000  # encoded size (Block.to_bytes) a valid block may not exceed
+EMPTY_MERKLE_ROOT = '0' * 64
 
-class Block:
-    def __init__(self, index, prev_hash, txs, timestamp=None, nonce=0, hash=None):
+def compute_merkle_root(txs):
+    # Bitcoin-style binary tree over txids; an odd node is paired with itself
+    level = [bytes.fromhex(tx.txid()) for tx in txs]
+    if not level:
+        return EMPTY_MERKLE_ROOT
+    while len(level) > 1:
+        if len(level) % 2:
+            level.append(level[-1])
+        level = [hashlib.sha256(level[i] + level[i + 1]).digest() for i in range(0, len(level), 2)]
+    return level[0].hex()
+
+# Canonical header: version, index, prev_hash, merkle_root, state_root, timestamp,
+# then the nonce last so miners can hash the constant prefix once and reuse the midstate.
+HEADER_VERSION = 2
+HEADER_PREFIX = struct.Struct('>BQ32s32s32sd')
+NONCE = struct.Struct('>Q')
+MAX_NONCE = 2**64 - 1
+# Block.to_bytes() minus the txs: codec version, header, hash, tx count
+BLOCK_OVERHEAD = 1 + HEADER_PREFIX.size + NONCE.size + 1 + 32 + 4
+
+def difficulty_target(difficulty):
+    # A hex digest starts with `difficulty` zeros iff the raw digest is below this bound
+    return (1 << (256 - 4 * difficulty)).to_bytes(33, 'big')[1:] if difficulty else b'\xff' * 33
+
+def search_nonce(prefix, difficulty, start, count):
+    """
+    Try nonces [start, start+count) against the header prefix. The prefix is
+    hashed once; each try copies that SHA-256 state and feeds in 8 nonce bytes.
+    Returns (nonce, hash) or None.
+    """
+    target = difficulty_target(difficulty)
+    base = hashlib.sha256(prefix)
+    pack = NONCE.pack
+    for nonce in range(start, min(start + count, MAX_NONCE + 1)):
+        h = base.copy()
+        h.update(pack(nonce))
+        d = h.digest()
+        if d < target:
+            return nonce, d.hex()
+    return None
+
+class Block(Freezable):
+    def __init__(self, index, prev_hash, txs, timestamp=None, nonce=0, hash=None, merkle_root=None, state_root=None):
         self.index = index
         self.prev_hash = prev_hash
         self.txs = txs  # list of Transaction objects
         self.timestamp = timestamp or time.time()
         self.nonce = nonce
         self.hash = hash
+        # The body is committed to only through the Merkle root in the header
+        self.merkle_root = merkle_root or compute_merkle_root(txs)
+        # Ledger state root after applying this block (see statetree.py)
+        self.state_root = state_root or EMPTY_ROOT
+
+    def header(self):
+        return {
+            'index': self.index,
+            'prev_hash': self.prev_hash,
+            'merkle_root': self.merkle_root,
+            'state_root': self.state_root,
+            'timestamp': self.timestamp,
+            'nonce': self.nonce
+        }
+
+    def freeze(self):
+        # Called once the block is final (mined, or received with its hash);
+        # its transactions are frozen with it and txs becomes a tuple.
+        if not self._frozen:
+            for tx in self.txs:
+                tx.freeze()
+            self.txs = tuple(self.txs)
+        return super().freeze()
+
+    def tx_root(self):
+        """Merkle root recomputed from the body (memoized once frozen)."""
+        return self._cached('tx_root', lambda: compute_merkle_root(self.txs))
 
     def to_dict(self):
+        return self._cached('dict', self._to_dict)
+
+    def _to_dict(self):
         return {
             'index': self.index,
             'prev_hash': self.prev_hash,
+            'merkle_root': self.merkle_root,
+            'state_root': self.state_root,
             'txs': [tx.to_dict() for tx in self.txs],
             'timestamp': self.timestamp,
             'nonce': self.nonce,
@@ -26,37 +103,77 @@ class Block:
 
     @classmethod
     def from_dict(cls, d):
-        txs = [Transaction.from_dict(txd) for txd in d['txs']]
-        return cls(d['index'], d['prev_hash'], txs, d['timestamp'], d['nonce'], d['hash'])
+        txs = [tx_from_dict(txd) for txd in d['txs']]
+        b = cls(d['index'], d['prev_hash'], txs, d['timestamp'], d['nonce'], d['hash'], d.get('merkle_root'), d.get('state_root'))
+        return b.freeze() if b.hash else b
+
+    def to_bytes(self):
+        return self._cached('bytes', self._to_bytes)
+
+    def _to_bytes(self):
+        return b''.join([
+            codec.u8(codec.CODEC_VERSION),
+            self.header_bytes(),
+            codec.var_bytes(bytes.fromhex(self.hash) if self.hash else None, 1),
+            codec.u32(len(self.txs)),
+        ] + [codec.var_bytes(tx.to_bytes(), 4) for tx in self.txs])
+
+    @classmethod
+    def from_bytes(cls, data):
+        r = codec.Reader(data)
+        r.version()
+        version, index, prev_hash, merkle_root, state_root, timestamp = HEADER_PREFIX.unpack(r.raw(HEADER_PREFIX.size))
+        if version != HEADER_VERSION:
+            raise codec.CodecError(f"Unsupported header version {version}")
+        nonce = r.u64()
+        h = r.var_bytes(1)
+        txs = [tx_from_bytes(r.var_bytes(4)) for _ in range(r.u32())]
+        r.done()
+        b = cls(index, prev_hash.hex(), txs, timestamp, nonce, h.hex() if h else None, merkle_root.hex(), state_root.hex())
+        return b.freeze() if b.hash else b
+
+    def header_prefix(self):
+        return HEADER_PREFIX.pack(
+            HEADER_VERSION,
+            self.index,
+            bytes.fromhex(self.prev_hash),
+            bytes.fromhex(self.merkle_root),
+            bytes.fromhex(self.state_root),
+            self.timestamp
+        )
+
+    def header_bytes(self):
+        return self.header_prefix() + NONCE.pack(self.nonce)
 
     def compute_hash(self):
-        block_str = json.dumps({
-            'index': self.index,
-            'prev_hash': self.prev_hash,
-            'txs': [tx.to_dict() for tx in self.txs],
-            'timestamp': self.timestamp,
-            'nonce': self.nonce
-        }, sort_keys=True)
-        return hashlib.sha256(block_str.encode()).hexdigest()
+        # Only the fixed-size header is hashed, however many txs the block carries
+        return self._cached('hash', lambda: hashlib.sha256(self.header_bytes()).hexdigest())
 
-def mine_block(block, difficulty=DIFFICULTY):
-    prefix = '0' * difficulty
+def mine_block(block, difficulty=DIFFICULTY, chunk_size=100000):
+    prefix = block.header_prefix()
     while True:
-        h = block.compute_hash()
-        if h.startswith(prefix):
-            block.hash = h
-            return block
-        block.nonce += 1
+        found = search_nonce(prefix, difficulty, block.nonce, chunk_size)
+        if found:
+            block.nonce, block.hash = found
+            return block.freeze()
+        block.nonce += chunk_size
+        if block.nonce > MAX_NONCE:
+            raise ValueError("Nonce space exhausted; change the timestamp and retry")
 
 def verify_block(block, prev_hash, parent_ledger, difficulty=DIFFICULTY):
     if block.prev_hash != prev_hash:
         print("[!] Invalid prev_hash!"); return False
-    if not block.hash or not block.hash.startswith('0' * difficulty):
+    if len(block.to_bytes()) > MAX_BLOCK_BYTES:
+        print("[!] Block too large!"); return False
+    if block.merkle_root != block.tx_root():
+        print("[!] Merkle root does not match block txs!"); return False
+    if not block.hash or block.hash != block.compute_hash() or not block.hash.startswith('0' * difficulty):
         print("[!] Invalid PoW!"); return False
-    ledger_copy = parent_ledger.clone()
-    for tx in block.txs:
-        if not ledger_copy.execute_transaction(tx):
-            print("[!] Invalid transaction in block!"); return False
+    ledger_view = parent_ledger.overlay()
+    if not ledger_view.execute_all(block.txs):
+        print("[!] Invalid transaction in block!"); return False
+    if ledger_view.state_root() != block.state_root:
+        print("[!] State root does not match the ledger after this block!"); return False
     return True
 
 def adjust_difficulty(blocks, target_block_time=5, window=100):
@@ -80,13 +197,15 @@ GENESIS_BLOCK = {
     'nonce': 0,
 }
 
-def make_genesis_block():
+def make_genesis_block(ledger=None):
+    # With a ledger, genesis commits to the initial balances through its state root
     b = Block(
         GENESIS_BLOCK['index'],
         GENESIS_BLOCK['prev_hash'],
         [],
         GENESIS_BLOCK['timestamp'],
-        GENESIS_BLOCK['nonce']
+        GENESIS_BLOCK['nonce'],
+        state_root=ledger.state_root() if ledger is not None else None
     )
     b.hash = b.compute_hash()
-    return b
\ No newline at end of file
+    return b.freeze()
\ No newline at end of file
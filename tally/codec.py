@@ -0,0 +1,74 @@
+# tally/codec.py
+# Primitives for the canonical binary encoding used for hashing, signing, the
+# P2P wire and on-disk storage. All integers are big-endian and fixed width;
+# variable-length fields carry a length prefix. JSON stays at the HTTP edge.
+import struct
+
+CODEC_VERSION = 2  # 2: amounts and fees as u64 atoms
+
+_U8 = struct.Struct('>B')
+_U16 = struct.Struct('>H')
+_U32 = struct.Struct('>I')
+_U64 = struct.Struct('>Q')
+_F64 = struct.Struct('>d')
+_LEN = {1: _U8, 2: _U16, 4: _U32}
+
+class CodecError(ValueError):
+    pass
+
+def u8(n): return _U8.pack(n)
+def u16(n): return _U16.pack(n)
+def u32(n): return _U32.pack(n)
+def u64(n): return _U64.pack(n)
+def f64(x): return _F64.pack(x)
+
+def var_bytes(b, width=2):
+    """Length-prefixed bytes; None is encoded the same as empty."""
+    b = b or b''
+    return _LEN[width].pack(len(b)) + b
+
+def var_str(s, width=2):
+    return var_bytes(s.encode() if s is not None else None, width)
+
+class Reader:
+    def __init__(self, data):
+        self.data = memoryview(data)
+        self.pos = 0
+
+    def raw(self, n):
+        if self.pos + n > len(self.data):
+            raise CodecError("Truncated data")
+        b = self.data[self.pos:self.pos + n].tobytes()
+        self.pos += n
+        return b
+
+    def _unpack(self, st):
+        if self.pos + st.size > len(self.data):
+            raise CodecError("Truncated data")
+        (v,) = st.unpack_from(self.data, self.pos)
+        self.pos += st.size
+        return v
+
+    def u8(self): return self._unpack(_U8)
+    def u16(self): return self._unpack(_U16)
+    def u32(self): return self._unpack(_U32)
+    def u64(self): return self._unpack(_U64)
+    def f64(self): return self._unpack(_F64)
+
+    def var_bytes(self, width=2):
+        """Inverse of var_bytes(); an empty field decodes to None."""
+        return self.raw(self._unpack(_LEN[width])) or None
+
+    def var_str(self, width=2):
+        b = self.var_bytes(width)
+        return b.decode() if b is not None else None
+
+    def version(self):
+        v = self.u8()
+        if v != CODEC_VERSION:
+            raise CodecError(f"Unsupported encoding version {v}")
+        return v
+
+    def done(self):
+        if self.pos != len(self.data):
+            raise CodecError(f"{len(self.data) - self.pos} trailing bytes")
@@ -3,7 +3,9 @@ from cryptography.hazmat.primitives.asymmetric import ec
 from cryptography.hazmat.primitives import serialization, hashes
 from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
-import os
+import os, base64, functools
+
+PUBKEY_CACHE_SIZE = 4096  # parsed sender keys kept; active senders repeat across txs
 
 def gen_keypair():
     priv = ec.generate_private_key(ec.SECP256R1())
@@ -17,6 +19,11 @@ def gen_keypair():
 def load_public_key(pem_bytes):
     return serialization.load_pem_public_key(pem_bytes)
 
+@functools.lru_cache(maxsize=PUBKEY_CACHE_SIZE)
+def parse_public_key(b64_der):
+    """EllipticCurvePublicKey for a base64 DER SubjectPublicKeyInfo (as carried by txs), LRU-cached."""
+    return serialization.load_der_public_key(base64.b64decode(b64_der))
+
 def gen_ecc_keypair_raw():
     priv = ec.generate_private_key(ec.SECP256R1())
     pub = priv.public_key()
@@ -0,0 +1,145 @@
+# tally/executor.py
+import os
+from concurrent.futures import ProcessPoolExecutor
+from .transaction import sig_cache
+
+# Worker processes for ParallelExecutor; override with TALLY_EXEC_WORKERS (0 = sequential)
+EXEC_WORKERS = int(os.environ.get('TALLY_EXEC_WORKERS', 0))
+# Smaller batches run sequentially; process round-trips would cost more than they save
+PARALLEL_MIN_TXS = 64
+
+def conflict_groups(txs):
+    """
+    Split txs into groups that share no account (union-find over each tx's
+    accounts(): sender, recipients and created accounts). Groups hold tx
+    indices in block order and are ordered by their first tx.
+    """
+    parent = {}
+    def find(a):
+        while parent[a] != a:
+            parent[a] = parent[parent[a]]
+            a = parent[a]
+        return a
+    for tx in txs:
+        roots = [find(parent.setdefault(a, a)) for a in tx.accounts()]
+        for r in roots[1:]:
+            parent[find(r)] = find(roots[0])
+    groups = {}
+    for i, tx in enumerate(txs):
+        groups.setdefault(find(tx.accounts()[0]), []).append(i)
+    return list(groups.values())
+
+def checked_signatures(ledger, txs):
+    """
+    Verify txs' signatures here, where sig_cache is warm from admission, so
+    workers (each with a cold cache of its own) need not redo the ECDSA.
+    Returns {tx index: key it was verified with, None for the tx's own key}.
+    A keyless tx is checked against its sender's registered key, or the key
+    an earlier tx in txs will register. Failures are left out; the worker's
+    own check rejects them.
+    """
+    checked, block_keys = {}, {}
+    for i, tx in enumerate(txs):
+        key = None
+        if not tx.public_key:
+            key = ledger.pubkeys.get(tx.sender_addr) or block_keys.get(tx.sender_addr)
+            if key is None:
+                continue
+        else:
+            block_keys.setdefault(tx.sender_addr, tx.public_key)
+        try:
+            sig_cache.verify(tx, key)
+        except Exception:
+            continue
+        checked[i] = key
+    return checked
+
+def _execute_chunk(accounts, txs, checked=None):
+    """
+    Worker: run txs in order on a throwaway ledger holding only the accounts
+    they touch. checked ({index: key}) lists signatures the parent already
+    verified. Returns ({addr: (balance, nonce)}, fees, {addr: newly
+    registered pubkey}) or None if a tx fails.
+    """
+    from .ledger import Ledger
+    for i, key in (checked or {}).items():
+        sig_cache.record(txs[i], key)
+    sub = Ledger({}, undo_depth=0)
+    for addr, (balance, nonce, pubkey) in accounts.items():
+        sub.balances[addr] = balance
+        sub.nonces[addr] = nonce
+        if pubkey:
+            sub.pubkeys[addr] = pubkey
+    sub.total_supply = sub.circulating = sum(balance for balance, _, _ in accounts.values())
+    for tx in txs:
+        if not sub.execute_transaction(tx):
+            return None
+    # Accounts created in this chunk are not in `accounts` and had no key before it
+    registered = {addr: key for addr, key in sub.pubkeys.items() if not accounts.get(addr, (0, 0, None))[2]}
+    return {addr: (sub.balances[addr], sub.nonces[addr]) for addr in sub.balances}, sub.fee_collected, registered
+
+class ParallelExecutor:
+    """
+    Executes a block's txs across a process pool. Txs that share no account
+    cannot affect each other, so each conflict group runs in order on its own
+    worker and the results are merged back in block order. Accounts are
+    created in the same order as sequential execution, so the ledger ends up
+    identical (same table IDs, totals and state root).
+    """
+    def __init__(self, workers=None, min_txs=PARALLEL_MIN_TXS):
+        self.workers = workers or EXEC_WORKERS or os.cpu_count() or 1
+        self.min_txs = min_txs
+        self._pool = None
+
+    def execute(self, ledger, txs):
+        """Like executing txs one by one on ledger, but all-or-nothing."""
+        groups = conflict_groups(txs) if len(txs) >= self.min_txs else []
+        if len(groups) < 2 or self.workers < 2:
+            return all(ledger.execute_transaction(tx) for tx in txs)
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(self.workers)
+        checked = checked_signatures(ledger, txs)
+        # Deal groups largest-first onto the least loaded chunk
+        chunks = [[] for _ in range(min(self.workers, len(groups)))]
+        for group in sorted(groups, key=len, reverse=True):
+            min(chunks, key=len).extend(group)
+        futures = []
+        for chunk in chunks:
+            chunk.sort()
+            chunk_txs = [txs[i] for i in chunk]
+            chunk_checked = {n: checked[i] for n, i in enumerate(chunk) if i in checked}
+            accounts = {}
+            for tx in chunk_txs:
+                for addr in tx.accounts():
+                    if addr not in accounts and addr in ledger.balances:
+                        accounts[addr] = (ledger.balances[addr], ledger.nonces.get(addr, 0), ledger.pubkeys.get(addr))
+            futures.append(self._pool.submit(_execute_chunk, accounts, chunk_txs, chunk_checked))
+        results = [f.result() for f in futures]
+        if None in results:
+            return False
+        merged, fees, registered = {}, 0, {}
+        for accounts, chunk_fees, chunk_keys in results:
+            merged.update(accounts)
+            fees += chunk_fees
+            registered.update(chunk_keys)
+        self._merge(ledger, txs, merged, fees)
+        for addr, key in registered.items():
+            ledger.pubkeys[addr] = key
+        return True
+
+    def _merge(self, ledger, txs, merged, fees):
+        # First mention in block order is where sequential execution creates an account
+        for tx in txs:
+            for addr in tx.accounts():
+                if addr in merged:
+                    ledger.balances[addr], ledger.nonces[addr] = merged.pop(addr)
+                    ledger._dirty.add(addr)
+        ledger.fee_collected += fees
+        ledger.circulating -= fees
+        if ledger.circulating + ledger.staked + ledger.fee_collected != ledger.total_supply:
+            raise Exception("Supply invariant broken!")
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
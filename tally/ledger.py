@@ -1,27 +1,120 @@
 # tally/ledger.py
-from decimal import Decimal, getcontext
-from .transaction import Transaction
+from collections.abc import MutableMapping
+from .transaction import Transaction, BatchTransaction, sig_cache, MAX_BATCH_OUTPUTS
+from . import codec
+from .amount import to_atoms, format_atoms, check_atoms
+from .accounts import AccountTable, ColumnView, KeyRegistry
+from .statetree import StateTree, account_leaf
 
-getcontext().prec = 42
-ACCOUNT_CREATION_FEE = Decimal("0.001")
-MIN_NEW_ACCOUNT_AMOUNT = Decimal("0.0000000001")
-MIN_TX_FEE = Decimal("0.0001")
+# All amounts are integer atoms (see amount.py)
+ACCOUNT_CREATION_FEE = to_atoms("0.001")
+MIN_NEW_ACCOUNT_AMOUNT = to_atoms("0.0000000001")
+MIN_TX_FEE = to_atoms("0.0001")
+UNDO_DEPTH = 100  # blocks that can be rolled back with rollback_to()
+
+def tx_cost(tx):
+    """Atoms debited from the sender: amount, fee and any account creation fees."""
+    return tx.amount + tx.fee + ACCOUNT_CREATION_FEE * len(tx.new_accounts())
+
+class UndoRecord:
+    """
+    What apply_block() needs to unwind one block: the previous balance,
+    nonce and stake of every pre-existing account it touched, the fees it
+    collected, the accounts it created and the senders whose public key it
+    registered.
+    """
+    def __init__(self, height, entries, fee_delta=0, created=None, registered=None):
+        self.height = height      # ledger height before the block
+        self.entries = entries    # [(addr, balance, nonce, stake)]
+        self.fee_delta = fee_delta
+        self.created = created or []
+        self.registered = registered or []
+
+    def to_bytes(self):
+        parts = [codec.u8(codec.CODEC_VERSION), codec.u64(self.height), codec.u32(len(self.entries))]
+        for addr, balance, nonce, stake in self.entries:
+            parts += [codec.var_str(addr), codec.u64(balance), codec.u64(nonce), codec.u64(stake)]
+        parts += [codec.u64(self.fee_delta), codec.u32(len(self.created))]
+        parts += [codec.var_str(addr) for addr in self.created]
+        parts += [codec.u32(len(self.registered))] + [codec.var_str(addr) for addr in self.registered]
+        return b''.join(parts)
+
+    @classmethod
+    def from_bytes(cls, data):
+        r = codec.Reader(data)
+        r.version()
+        height = r.u64()
+        entries = [(r.var_str(), r.u64(), r.u64(), r.u64()) for _ in range(r.u32())]
+        fee_delta = r.u64()
+        created = [r.var_str() for _ in range(r.u32())]
+        registered = [r.var_str() for _ in range(r.u32())]
+        r.done()
+        return cls(height, entries, fee_delta, created, registered)
 
 class Ledger:
-    def __init__(self, initial_balances):
-        self.balances = {k: Decimal(str(v)) for k, v in initial_balances.items()}
-        self.nonces = {k: 0 for k in self.balances}
+    def __init__(self, initial_balances, audit_interval=None, undo_depth=UNDO_DEPTH):
+        # Accounts live in an interned, column-backed table; balances, nonces
+        # and stakes are dict-like views over it (amounts in atoms).
+        self._bind(AccountTable())
+        # Public key of every address that has signed a tx, so later txs from
+        # it may leave the key out (base64 DER, as in Transaction.public_key)
+        self.pubkeys = KeyRegistry()
+        for k, v in initial_balances.items():
+            self.balances[k] = check_atoms(v, f"balance of {k}")  # atoms; int() would truncate tally amounts
         self.total_supply = sum(self.balances.values())
-        self.fee_collected = Decimal("0")
-        self.stakes = {}  # Add staking information
+        self.fee_collected = 0
+        # Running totals kept in step with every balance/stake change, so the
+        # supply invariant is O(1) per tx; audit() re-sums everything.
+        self.circulating = self.total_supply
+        self.staked = 0
+        self.height = 0  # blocks applied through apply_block
+        self.audit_interval = audit_interval  # full audit every N blocks (None = never)
+        self.undo_depth = undo_depth
+        self.undo_log = []  # UndoRecord per applied block, oldest first
+        # Sparse Merkle commitment to every account; only addresses touched
+        # since the last state_root() call are re-hashed.
+        self.state = StateTree()
+        self._dirty = set(initial_balances)
+        self.executor = None  # e.g. executor.ParallelExecutor; None runs txs one by one
     
+    def _bind(self, accounts):
+        self.accounts = accounts
+        self.balances = ColumnView(accounts, 'balance')
+        self.nonces = ColumnView(accounts, 'nonce')
+        self.stakes = ColumnView(accounts, 'stake', sparse=True)  # Add staking information
+
+    def state_root(self):
+        self._flush_state(self.state, self._dirty)
+        self._dirty.clear()
+        return self.state.root()
+
+    def _flush_state(self, tree, addrs):
+        for addr in addrs:
+            if addr in self.balances:
+                tree.set(addr, account_leaf(addr, self.balances[addr], self.nonces.get(addr, 0), self.stakes.get(addr, 0)))
+            else:
+                tree.remove(addr)
+
+    def prove(self, addr):
+        """(state root, committed leaf value or None, sibling hashes) for addr."""
+        root = self.state_root()
+        value, siblings = self.state.prove(addr)
+        return root, value, siblings
+
+    def rich_list(self, n=10):
+        """[(address, balance)] for the n largest balances."""
+        return self.accounts.top('balance', n)
+
     def stake(self, addr, amount):
         if addr not in self.balances:
             raise ValueError("Address not found")
         if self.balances[addr] < amount:
             raise ValueError("Insufficient funds to stake")
         self.balances[addr] -= amount
-        self.stakes[addr] = self.stakes.get(addr, Decimal("0")) + amount
+        self.stakes[addr] = self.stakes.get(addr, 0) + amount
+        self.circulating -= amount
+        self.staked += amount
+        self._dirty.add(addr)
 
     def unstake(self, addr, amount):
         if addr not in self.stakes:
@@ -29,77 +122,346 @@ class Ledger:
         if self.stakes[addr] < amount:
             raise ValueError("Insufficient stake to unstake")
         self.balances[addr] += amount
-        self.stakes[addr] -= amount
-        if self.stakes[addr] == Decimal("0"):
+        remaining = self.stakes[addr] - amount
+        if remaining:
+            self.stakes[addr] = remaining
+        else:
             del self.stakes[addr]
+        self.circulating += amount
+        self.staked -= amount
+        self._dirty.add(addr)
 
     def pretty_balances(self):
         for k, v in self.balances.items():
-            print(f"Short acct {k[:40]}...: {v}")
+            print(f"Short acct {k[:40]}...: {format_atoms(v)}")
 
     def validate_transaction(self, tx: Transaction):
-        try: tx.verify_signature()
-        except Exception:
-            print("[!] Reject: Invalid signature"); return False
+        return self.validate_stateless(tx) and self.validate_state(tx)
+
+    def validate_stateless(self, tx: Transaction):
+        """Checks that depend only on the tx itself; the signature is verified once per node."""
+        if not isinstance(tx, BatchTransaction) and not (tx.recipient_addr and isinstance(tx.recipient_addr, str)):
+            print("[!] Reject: Missing recipient address"); return False
+        if tx.public_key:  # keyless txs are checked against the registry in validate_state
+            try: sig_cache.verify(tx)
+            except Exception:
+                print("[!] Reject: Invalid signature"); return False
+        if tx.fee < MIN_TX_FEE:
+            print("[!] Reject: Fee too low"); return False
+        if tx.new_account_addr and tx.amount < MIN_NEW_ACCOUNT_AMOUNT:
+            print("[!] Reject: Amount sent for new account too small"); return False
+        if tx.amount < 0:
+            print("[!] Reject: Negative send amount"); return False
+        if isinstance(tx, BatchTransaction):
+            return self._validate_outputs(tx)
+        return True
+
+    def _validate_outputs(self, tx: BatchTransaction):
+        if not tx.outputs:
+            print("[!] Reject: Batch has no outputs"); return False
+        if len(tx.outputs) > MAX_BATCH_OUTPUTS:
+            print(f"[!] Reject: Batch has more than {MAX_BATCH_OUTPUTS} outputs"); return False
+        # The fee floor is per output, as if each payment were its own tx
+        if tx.fee < MIN_TX_FEE * len(tx.outputs):
+            print("[!] Reject: Fee too low for batch size"); return False
+        if len({addr for addr, _, _ in tx.outputs}) != len(tx.outputs):
+            print("[!] Reject: Duplicate batch recipient"); return False
+        for addr, amount, new in tx.outputs:
+            if amount < 0:
+                print("[!] Reject: Negative send amount"); return False
+            if new and amount < MIN_NEW_ACCOUNT_AMOUNT:
+                print("[!] Reject: Amount sent for new account too small"); return False
+        return True
+
+    def validate_state(self, tx: Transaction):
+        """Checks against the accounts: sender, registered key, nonce, new account, balance."""
         if tx.sender_addr not in self.balances:
             print("[!] Reject: Sender address not found"); return False
+        registered = self.pubkeys.get(tx.sender_addr)
+        if not tx.public_key:
+            if registered is None:
+                print("[!] Reject: No public key registered for sender"); return False
+            try: sig_cache.verify(tx, registered)
+            except Exception:
+                print("[!] Reject: Invalid signature"); return False
+        elif registered is not None and tx.public_key != registered:
+            print("[!] Reject: Public key does not match the sender's registered key"); return False
         expected_nonce = self.nonces.get(tx.sender_addr, 0)
         if tx.nonce != expected_nonce:
             print(f"[!] Reject: Bad nonce. Got {tx.nonce}, expected {expected_nonce}"); return False
-        total_cost = tx.amount
-        if tx.fee < MIN_TX_FEE:
-            print("[!] Reject: Fee too low")
-            return False
-        if tx.new_account_addr:
-            total_cost += ACCOUNT_CREATION_FEE
-            if tx.amount < MIN_NEW_ACCOUNT_AMOUNT:
-                print("[!] Reject: Amount sent for new account too small"); return False
-            if tx.new_account_addr in self.balances:
-                print("[!] Reject: New account already exists"); return False
-        if self.balances[tx.sender_addr] < total_cost:
+        if any(addr in self.balances for addr in tx.new_accounts()):
+            print("[!] Reject: New account already exists"); return False
+        if isinstance(tx, BatchTransaction) and any(addr not in self.balances for addr, _, new in tx.outputs if not new):
+            print("[!] Reject: Batch recipient not found"); return False
+        if self.balances[tx.sender_addr] < tx_cost(tx):
             print("[!] Reject: Insufficient funds including fees"); return False
-        if tx.amount < Decimal("0"):
-            print("[!] Reject: Negative send amount"); return False
         return True
 
     def execute_transaction(self, tx: Transaction):
         if not self.validate_transaction(tx): return False
 
-        total_cost = tx.amount + tx.fee
-        if tx.new_account_addr:
-            total_cost += ACCOUNT_CREATION_FEE
-
+        total_cost = tx_cost(tx)
         self.balances[tx.sender_addr] -= total_cost
 
-        if tx.recipient_addr not in self.balances:
-            self.balances[tx.recipient_addr] = Decimal("0")
-        self.balances[tx.recipient_addr] += tx.amount
+        created = tx.new_accounts()
+        creating = [addr for addr in created if addr not in self.balances]
+        for addr, amount in tx.credits():
+            if addr not in self.balances:
+                self.balances[addr] = 0
+            self.balances[addr] += amount
 
-        # Handle creation of new account
-        if tx.new_account_addr and tx.new_account_addr not in self.nonces:
-            print(f"[*] New account created: {tx.new_account_addr[:42]}..., by funding from {tx.sender_addr[:42]}...")
-            self.nonces[tx.new_account_addr] = 0
+        # Handle creation of new accounts
+        for addr in creating:
+            print(f"[*] New account created: {addr[:42]}..., by funding from {tx.sender_addr[:42]}...")
+            self.nonces[addr] = 0
 
-        if tx.new_account_addr:
-            self.fee_collected += ACCOUNT_CREATION_FEE
+        self.fee_collected += ACCOUNT_CREATION_FEE * len(created)
 
         self.fee_collected += tx.fee  # Always add transaction fee
 
         self.nonces[tx.sender_addr] += 1
+        if tx.public_key and tx.sender_addr not in self.pubkeys:
+            self.pubkeys[tx.sender_addr] = tx.public_key
+        self._dirty.update(tx.accounts())
+
+        # Balances moved by -total_cost + amount; the difference is what went to fees
+        fees = total_cost - tx.amount
+        self.circulating -= fees
+        current = self.circulating + self.staked + self.fee_collected
+        if current != self.total_supply:
+            print(f"Circulating: {self.circulating}")
+            print(f"Staked: {self.staked}")
+            print(f"Fee collected: {self.fee_collected}")
+            print(f"Total supply: {self.total_supply}")
+            print(f"Supply check: {current}")
+            raise Exception("Supply invariant broken!")
+        return True
+
+    def apply_block(self, block):
+        """Apply all txs of a block atomically and journal how to undo it."""
+        undo = self._journal(block) if self.undo_depth else None
+        fee_before, accounts_before = self.fee_collected, len(self.accounts)
+        applied = False
+        try:
+            applied = self.execute_all(block.txs)
+        finally:
+            if not applied and undo:  # rejected or raised part-way
+                self._seal(undo, fee_before, accounts_before)
+                self._unwind(undo)
+        if not applied:
+            return False
+        if undo:
+            self._seal(undo, fee_before, accounts_before)
+            self.undo_log.append(undo)
+            del self.undo_log[:-self.undo_depth]
+        self.height += 1
+        if self.audit_interval and self.height % self.audit_interval == 0:
+            self.audit()
+        return True
 
-        current = sum(self.balances.values()) + self.fee_collected
-        if abs(current - self.total_supply) > Decimal('1e-30'):
-            print(f"Balances sum: {sum(self.balances.values())}")
+    def execute_all(self, txs):
+        """
+        Execute txs in block order, on self.executor when one is set. On
+        failure the ledger may be left part-way; callers unwind or discard.
+        """
+        if self.executor is not None:
+            return self.executor.execute(self, txs)
+        return all(self.execute_transaction(tx) for tx in txs)
+
+    def _journal(self, block):
+        # O(touched accounts): only the block's senders/recipients are recorded
+        table = self.accounts
+        entries, seen = [], set()
+        for tx in block.txs:
+            for addr in tx.accounts():
+                if addr not in seen:
+                    seen.add(addr)
+                    i = table.lookup(addr)
+                    if i is not None:
+                        entries.append((addr, table.balance[i], table.nonce[i], table.stake[i]))
+        # Senders without a key yet; _seal keeps the ones the block registered
+        fresh = list(dict.fromkeys(tx.sender_addr for tx in block.txs if tx.sender_addr not in self.pubkeys))
+        return UndoRecord(self.height, entries, registered=fresh)
+
+    def _seal(self, undo, fee_before, accounts_before):
+        undo.fee_delta = self.fee_collected - fee_before
+        undo.created = [self.accounts.address(i) for i in range(accounts_before, len(self.accounts))]
+        undo.registered = [addr for addr in undo.registered if addr in self.pubkeys]
+
+    def _unwind(self, undo):
+        table = self.accounts
+        for addr, balance, nonce, stake in undo.entries:
+            i = table.lookup(addr)
+            table.balance[i], table.nonce[i], table.stake[i] = balance, nonce, stake
+        table.drop(undo.created)
+        for addr in undo.registered:
+            self.pubkeys.pop(addr, None)
+        self._dirty.update(addr for addr, _, _, _ in undo.entries)
+        self._dirty.update(undo.created)
+        self.fee_collected -= undo.fee_delta
+        self.circulating += undo.fee_delta
+        self.height = undo.height
+
+    def rollback_to(self, height):
+        """Unwind applied blocks until the ledger is back at `height`."""
+        if height < self.height - len(self.undo_log) or height > self.height:
+            raise ValueError(f"Cannot roll back from height {self.height} to {height}")
+        while self.height > height:
+            self._unwind(self.undo_log.pop())
+
+    def audit(self):
+        """Full O(accounts) check of the running totals against the ledger contents."""
+        balances_sum = sum(self.balances.values())
+        stakes_sum = sum(self.stakes.values())
+        current = balances_sum + stakes_sum + self.fee_collected
+        if balances_sum != self.circulating or stakes_sum != self.staked or current != self.total_supply:
+            print(f"Balances sum: {balances_sum} (running {self.circulating})")
+            print(f"Stakes sum: {stakes_sum} (running {self.staked})")
             print(f"Fee collected: {self.fee_collected}")
             print(f"Total supply: {self.total_supply}")
-            print(f"Supply check: {sum(self.balances.values()) + self.fee_collected}")
+            print(f"Supply check: {current}")
             raise Exception("Supply invariant broken!")
         return True
 
+    def overlay(self):
+        """Copy-on-write view for speculative execution; see OverlayLedger."""
+        return OverlayLedger(self)
+
     def clone(self):
         new = Ledger({})
-        new.balances = self.balances.copy()
-        new.nonces = self.nonces.copy()
+        new._bind(self.accounts.copy())
+        new.pubkeys = self.pubkeys.copy()
         new.total_supply = self.total_supply
         new.fee_collected = self.fee_collected
-        return new
\ No newline at end of file
+        new.circulating = self.circulating
+        new.staked = self.staked
+        new.height = self.height
+        new.audit_interval = self.audit_interval
+        new.undo_depth = self.undo_depth
+        new.undo_log = list(self.undo_log)
+        new.state = self.state.copy()
+        new._dirty = set(self._dirty)
+        new.executor = self.executor
+        return new
+
+_DELETED = object()
+
+class OverlayDict(MutableMapping):
+    """
+    Mapping that reads through to a parent mapping and keeps every write
+    (including deletes, as tombstones) in a local dict until commit().
+    """
+    def __init__(self, parent):
+        self.parent = parent
+        self.local = {}
+
+    def __getitem__(self, key):
+        if key in self.local:
+            v = self.local[key]
+            if v is _DELETED:
+                raise KeyError(key)
+            return v
+        return self.parent[key]
+
+    def __setitem__(self, key, value):
+        self.local[key] = value
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self.local[key] = _DELETED
+
+    def __contains__(self, key):
+        if key in self.local:
+            return self.local[key] is not _DELETED
+        return key in self.parent
+
+    def __iter__(self):
+        for key in self.parent:
+            if key not in self.local or self.local[key] is not _DELETED:
+                yield key
+        for key, v in self.local.items():
+            if v is not _DELETED and key not in self.parent:
+                yield key
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def copy(self):
+        return dict(self)
+
+    def commit(self):
+        for key, v in self.local.items():
+            if v is _DELETED:
+                self.parent.pop(key, None)
+            else:
+                self.parent[key] = v
+        self.local.clear()
+
+    def discard(self):
+        self.local.clear()
+
+class OverlayLedger(Ledger):
+    """
+    Ledger layered on a parent that is treated as read-only while the overlay
+    is open. Only accounts the overlay touches are stored, so trying out a
+    block costs O(touched accounts); commit() merges into the parent and
+    discard() drops the changes.
+    """
+    _SCALARS = ('total_supply', 'fee_collected', 'circulating', 'staked', 'height', 'audit_interval')
+
+    def __init__(self, parent):
+        self.parent = parent
+        self.balances = OverlayDict(parent.balances)
+        self.nonces = OverlayDict(parent.nonces)
+        self.stakes = OverlayDict(parent.stakes)
+        self.pubkeys = OverlayDict(parent.pubkeys)
+        self.undo_depth = 0  # discard() is the overlay's undo; no journal
+        self.executor = parent.executor
+        self._dirty = set()
+        self._load_scalars()
+
+    def _load_scalars(self):
+        for name in self._SCALARS:
+            setattr(self, name, getattr(self.parent, name))
+
+    def state_root(self):
+        # Path-copy the parent's tree; the parent itself is left untouched
+        self.parent.state_root()
+        tree = self.parent.state.copy()
+        self._flush_state(tree, self._dirty)
+        return tree.root()
+
+    # Whole-ledger operations need the account table, state tree or undo
+    # journal, which only the parent has; commit() and call them there
+    def _read_through(self, name):
+        raise TypeError(f"OverlayLedger is a read-through view and has no {name}(); commit() it and use the parent")
+
+    def apply_block(self, block):
+        self._read_through('apply_block')
+
+    def rollback_to(self, height):
+        self._read_through('rollback_to')
+
+    def clone(self):
+        self._read_through('clone')
+
+    def rich_list(self, n=10):
+        self._read_through('rich_list')
+
+    def prove(self, addr):
+        self._read_through('prove')
+
+    def commit(self):
+        for name in ('balances', 'nonces', 'stakes', 'pubkeys'):
+            getattr(self, name).commit()
+        for name in self._SCALARS:
+            setattr(self.parent, name, getattr(self, name))
+        self.parent._dirty |= self._dirty
+        self._dirty = set()
+
+    def discard(self):
+        for name in ('balances', 'nonces', 'stakes', 'pubkeys'):
+            getattr(self, name).discard()
+        self._dirty = set()
+        self._load_scalars()
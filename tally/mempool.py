@@ -0,0 +1,263 @@
+# tally/mempool.py
+import heapq, itertools, time
+from collections import deque
+from .pending import PendingState
+from .ledger import tx_cost
+
+MEMPOOL_MAX_TXS = 50000
+MEMPOOL_MAX_BYTES = 32 * 1024 * 1024
+MEMPOOL_EXPIRY = 3 * 3600  # seconds a tx may wait before it is dropped
+RBF_MIN_BUMP = 0.10  # a replacement must pay at least 10% more fee than the tx it replaces
+
+class _Entry:
+    __slots__ = ('tx', 'txid', 'size', 'fee_rate', 'added', 'seq')
+    def __init__(self, tx, added, seq):
+        self.tx = tx
+        self.txid = tx.txid()
+        self.size = len(tx.to_bytes())
+        self.fee_rate = tx.fee / self.size  # atoms per byte
+        self.added = added
+        self.seq = seq
+
+class Mempool:
+    """
+    Admitted txs, indexed for block building:
+      - entries: txid -> entry (dedup)
+      - queues: sender -> deque of txids in nonce order
+      - a max-heap on fee rate over the head tx of each sender queue, which
+        is all a block template can take next from that sender
+      - a min-heap on fee rate over the tail of each queue; when the pool is
+        over its count/byte cap the cheapest tail goes first, so no queue
+        ever gets a nonce gap
+    Both heaps use lazy deletion: stale items are skipped when they surface.
+    Admission goes through a PendingState, so nonces must continue each
+    sender's queue and the queue must be affordable. A tx reusing a queued
+    (sender, nonce) replaces the queued one if it pays min_bump more fee.
+    """
+    def __init__(self, ledger, max_txs=MEMPOOL_MAX_TXS, max_bytes=MEMPOOL_MAX_BYTES, expiry=MEMPOOL_EXPIRY,
+                 min_bump=RBF_MIN_BUMP):
+        self.pending = PendingState(ledger)
+        self.max_txs = max_txs
+        self.max_bytes = max_bytes
+        self.expiry = expiry
+        self.min_bump = min_bump
+        self.replacements = 0
+        self.entries = {}
+        self.queues = {}
+        self.creating = {}  # new account address -> txids that would create it
+        self.bytes = 0
+        self._heads = []   # (-fee_rate, seq, txid)
+        self._tails = []   # (fee_rate, seq, txid)
+        self._by_age = deque()  # (added, txid) in admission order
+        self._seq = itertools.count()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, txid):
+        return txid in self.entries
+
+    def __iter__(self):
+        """Txs in admission order."""
+        return (e.tx for e in sorted(self.entries.values(), key=lambda e: e.seq))
+
+    def add(self, tx, now=None):
+        """Admit tx; False if it is a duplicate, invalid, or too cheap to fit."""
+        if tx.txid() in self.entries:
+            print("[!] Reject: Duplicate transaction"); return False
+        now = time.time() if now is None else now
+        queue = self.queues.get(tx.sender_addr)
+        if queue and tx.nonce < self.pending.nonce(tx.sender_addr):
+            entry = self._replace(queue, tx, now)
+        elif self.pending.add(tx):
+            entry = self._insert(tx, now)
+        else:
+            entry = None
+        if entry is None:
+            return False
+        while len(self.entries) > self.max_txs or self.bytes > self.max_bytes:
+            if self._evict() is entry:
+                print("[!] Reject: Mempool full and fee rate too low"); return False
+        return True
+
+    def _insert(self, tx, added):
+        entry = _Entry(tx, added, next(self._seq))
+        self.entries[entry.txid] = entry
+        queue = self.queues.setdefault(tx.sender_addr, deque())
+        queue.append(entry.txid)
+        if len(queue) == 1:
+            heapq.heappush(self._heads, (-entry.fee_rate, entry.seq, entry.txid))
+        heapq.heappush(self._tails, (entry.fee_rate, entry.seq, entry.txid))
+        self._by_age.append((added, entry.txid))
+        self.bytes += entry.size
+        self._track(entry)
+        return entry
+
+    def _track(self, entry):
+        for addr in entry.tx.new_accounts():
+            self.creating.setdefault(addr, set()).add(entry.txid)
+
+    def _untrack(self, entry):
+        for addr in entry.tx.new_accounts():
+            txids = self.creating[addr]
+            txids.discard(entry.txid)
+            if not txids:
+                del self.creating[addr]
+
+    def _replace(self, queue, tx, now):
+        pos = tx.nonce - self.entries[queue[0]].tx.nonce
+        if pos < 0:
+            print(f"[!] Reject: Bad nonce. Got {tx.nonce}, already queued from {tx.nonce - pos}"); return None
+        old = self.entries[queue[pos]]
+        if tx.fee < old.tx.fee * (1 + self.min_bump):
+            print("[!] Reject: Replacement fee too low"); return None
+        if not self.pending.replace(old.tx, tx):
+            return None
+        # The old entry's heap items go stale and are skipped lazily
+        del self.entries[old.txid]
+        self._untrack(old)
+        entry = _Entry(tx, now, next(self._seq))
+        self.entries[entry.txid] = entry
+        self._track(entry)
+        queue[pos] = entry.txid
+        if pos == 0:
+            heapq.heappush(self._heads, (-entry.fee_rate, entry.seq, entry.txid))
+        if pos == len(queue) - 1:
+            heapq.heappush(self._tails, (entry.fee_rate, entry.seq, entry.txid))
+        self._by_age.append((now, entry.txid))
+        self.bytes += entry.size - old.size
+        self.replacements += 1
+        self._compact()
+        return entry
+
+    def stats(self):
+        return {
+            "count": len(self.entries),
+            "bytes": self.bytes,
+            "senders": len(self.queues),
+            "replacements": self.replacements,
+        }
+
+    def _pop_tail(self, sender):
+        queue = self.queues[sender]
+        entry = self.entries.pop(queue.pop())
+        self.bytes -= entry.size
+        self._untrack(entry)
+        self.pending.remove(entry.tx)
+        if queue:
+            tail = self.entries[queue[-1]]
+            heapq.heappush(self._tails, (tail.fee_rate, tail.seq, tail.txid))
+        else:
+            del self.queues[sender]
+        self._compact()
+        return entry
+
+    def _pop_head(self, sender):
+        # Head tx is confirmed or stale; the queue's next nonce is unchanged
+        queue = self.queues[sender]
+        entry = self.entries.pop(queue.popleft())
+        self.bytes -= entry.size
+        self._untrack(entry)
+        self.pending.remove_head(entry.tx)
+        if queue:
+            head = self.entries[queue[0]]
+            heapq.heappush(self._heads, (-head.fee_rate, head.seq, head.txid))
+        else:
+            del self.queues[sender]
+        self._compact()
+        return entry
+
+    def _drop_from(self, sender, txid):
+        """Drop txid and every later tx from its sender; returns how many went."""
+        dropped = 0
+        while sender in self.queues and txid in self.entries:
+            self._pop_tail(sender)
+            dropped += 1
+        return dropped
+
+    def _evict(self):
+        """Drop the cheapest tail tx and return its entry."""
+        while True:
+            _, _, txid = heapq.heappop(self._tails)
+            entry = self.entries.get(txid)
+            if entry and self.queues[entry.tx.sender_addr][-1] == txid:
+                return self._pop_tail(entry.tx.sender_addr)
+
+    def expire(self, now=None):
+        """Drop txs older than the expiry, with every later tx from the same sender."""
+        cutoff = (time.time() if now is None else now) - self.expiry
+        dropped = 0
+        while self._by_age and self._by_age[0][0] < cutoff:
+            _, txid = self._by_age.popleft()
+            entry = self.entries.get(txid)
+            if entry is None:
+                continue
+            dropped += self._drop_from(entry.tx.sender_addr, txid)
+        return dropped
+
+    def select(self):
+        """
+        Yield txs best fee rate first, each sender's txs in nonce order.
+        Each step is a heap pop/push, O(log senders); the pool is unchanged.
+        """
+        heap, seen = list(self._heads), set()
+        while heap:
+            _, _, txid = heapq.heappop(heap)
+            entry = self.entries.get(txid)
+            if entry is None or txid in seen:  # stale or re-admitted duplicate
+                continue
+            seen.add(txid)
+            yield entry.tx
+            queue = self.queues[entry.tx.sender_addr]
+            pos = entry.tx.nonce - self.entries[queue[0]].tx.nonce
+            if pos + 1 < len(queue):
+                nxt = self.entries[queue[pos + 1]]
+                heapq.heappush(heap, (-nxt.fee_rate, nxt.seq, nxt.txid))
+
+    def remove_confirmed(self, txs):
+        """
+        Post-block maintenance, O(accounts the block touched): for each
+        touched sender, drop queued txs whose nonce is now confirmed and
+        re-check the rest of its queue against the new balance; drop any
+        queued tx that would create an account the block created.
+        Everything else in the pool is left as it was.
+        """
+        ledger = self.pending.ledger
+        touched = {addr for tx in txs for addr in tx.accounts()}
+        for addr in touched:
+            if addr in self.queues:
+                self._revalidate(addr)
+            if addr in self.creating and addr in ledger.balances:
+                for txid in list(self.creating.get(addr, ())):
+                    if txid in self.entries:
+                        self._drop_from(self.entries[txid].tx.sender_addr, txid)
+
+    def _revalidate(self, sender):
+        ledger = self.pending.ledger
+        nonce = ledger.nonces.get(sender, 0)
+        while sender in self.queues and self.entries[self.queues[sender][0]].tx.nonce < nonce:
+            self._pop_head(sender)
+        queue = self.queues.get(sender)
+        if not queue:
+            return
+        # Signatures were checked on admission; only the account state can have changed
+        balance, spend, keep = ledger.balances.get(sender, 0), 0, 0
+        for txid in queue:
+            tx = self.entries[txid].tx
+            spend += tx_cost(tx)
+            if tx.nonce != nonce + keep or spend > balance:
+                break
+            keep += 1
+        while len(queue) > keep:
+            self._pop_tail(sender)
+            if sender not in self.queues:
+                break
+
+    def _compact(self):
+        # Rebuild the heaps once stale items dominate them
+        if len(self._tails) > 2 * len(self.entries) + 64:
+            self._tails = [(e.fee_rate, e.seq, e.txid) for e in map(self.entries.get, (q[-1] for q in self.queues.values()))]
+            heapq.heapify(self._tails)
+        if len(self._heads) > 2 * len(self.queues) + 64:
+            self._heads = [(-e.fee_rate, e.seq, e.txid) for e in map(self.entries.get, (q[0] for q in self.queues.values()))]
+            heapq.heapify(self._heads)
@@ -0,0 +1,271 @@
+# tally/miner.py
+import os, threading, queue, itertools, hashlib, time
+import multiprocessing as mp
+from collections import OrderedDict
+from .blockchain import DIFFICULTY, MAX_NONCE, NONCE, search_nonce, difficulty_target
+
+# Worker processes used by ParallelMiner; override with TALLY_MINER_WORKERS
+MINER_WORKERS = int(os.environ.get('TALLY_MINER_WORKERS', 0)) or os.cpu_count() or 1
+# Nonces a worker tries between checks of the shared stop flag
+CHUNK_SIZE = 20000
+
+def _search(prefix, difficulty, start, stride, chunk_size, stop, results):
+    """
+    Scan chunks start, start+stride, ... of the nonce space until a hash
+    meets the difficulty or another worker (or a cancel) sets stop.
+    """
+    while not stop.is_set() and start <= MAX_NONCE:
+        found = search_nonce(prefix, difficulty, start, chunk_size)
+        if found:
+            results.put(found)
+            stop.set()
+            return
+        start += stride
+
+class ParallelMiner:
+    """
+    Proof-of-work search split across a process pool. Worker i owns nonce
+    chunks i, i+workers, i+2*workers, ... so no two workers overlap; the
+    first solution stops everyone. A job can be cancelled from another
+    thread, e.g. when a new block moves the chain tip under it.
+    """
+    def __init__(self, workers=None, chunk_size=CHUNK_SIZE):
+        self.workers = workers or MINER_WORKERS
+        self.chunk_size = chunk_size
+        self._lock = threading.Lock()
+        self._stop = None
+        self._cancelled = threading.Event()
+        self.job_prev_hash = None
+
+    def mine(self, block, difficulty=DIFFICULTY):
+        """Set block.nonce/block.hash and return the block, or None if cancelled."""
+        found = self.search(block.header_prefix(), difficulty, block.nonce, block.prev_hash)
+        if found is None:
+            return None
+        block.nonce, block.hash = found
+        return block.freeze()
+
+    def search(self, prefix, difficulty=DIFFICULTY, start=0, prev_hash=None):
+        """
+        (nonce, hash) for a raw header prefix, or None if cancelled. prev_hash
+        tags the job so cancel_stale() can recognise it.
+        """
+        with self._lock:
+            self._cancelled.clear()
+            self.job_prev_hash = prev_hash
+            if self.workers <= 1:
+                self._stop = threading.Event()
+            else:
+                ctx = mp.get_context()
+                self._stop = ctx.Event()
+        try:
+            if self.workers <= 1:
+                results = queue.Queue()
+                _search(prefix, difficulty, start, self.chunk_size, self.chunk_size, self._stop, results)
+                found = None if results.empty() else results.get()
+            else:
+                found = self._mine_parallel(prefix, difficulty, start)
+        finally:
+            with self._lock:
+                self.job_prev_hash = None
+        if found is None or self._cancelled.is_set():
+            return None
+        return found
+
+    def _mine_parallel(self, prefix, difficulty, base_nonce):
+        ctx = mp.get_context()
+        results = ctx.Queue()
+        stride = self.workers * self.chunk_size
+        procs = [
+            ctx.Process(
+                target=_search,
+                args=(prefix, difficulty, base_nonce + i * self.chunk_size, stride, self.chunk_size, self._stop, results),
+                daemon=True
+            )
+            for i in range(self.workers)
+        ]
+        for p in procs:
+            p.start()
+        found = None
+        try:
+            while found is None and not self._stop.is_set():
+                try:
+                    found = results.get(timeout=0.05)
+                except queue.Empty:
+                    pass
+            if found is None and not self._cancelled.is_set():
+                # stop was set by a worker that found a solution just now
+                try:
+                    found = results.get(timeout=1)
+                except queue.Empty:
+                    pass
+        finally:
+            self._stop.set()
+            for p in procs:
+                p.join()
+        return found
+
+    def cancel(self):
+        with self._lock:
+            self._cancelled.set()
+            if self._stop is not None:
+                self._stop.set()
+
+    def cancel_stale(self, tip_hash):
+        """Cancel the running job if it is not building on tip_hash."""
+        with self._lock:
+            stale = self.job_prev_hash is not None and self.job_prev_hash != tip_hash
+        if stale:
+            print(f"[*] Chain tip moved to {tip_hash[:16]}..., cancelling stale mining job")
+            self.cancel()
+        return stale
+
+# A new tx restarts the running job when its fee rate is this many times the template's average
+REFRESH_FEE_RATIO = 2.0
+JOB_HISTORY = 100  # finished jobs kept for GET /mine/<job>
+
+class MiningService:
+    """
+    Mines off the request path. submit() queues a job and returns its id; a
+    single background thread builds a template for each job, mines it on a
+    ParallelMiner and, holding `lock`, checks the tip is unchanged and hands
+    the block to publish(), which returns False if it rejects it. If the tip moves (tip_moved) or a much better
+    paying tx arrives (tx_added) the job is restarted on a fresh template.
+    """
+    def __init__(self, miner, builder, tip, publish, lock, difficulty=DIFFICULTY, refresh_ratio=REFRESH_FEE_RATIO):
+        self.miner = miner
+        self.builder = builder
+        self.tip = tip            # () -> current tip block
+        self.publish = publish    # (block) -> True once on the chain; called with lock held
+        self.lock = lock
+        self.difficulty = difficulty
+        self.refresh_ratio = refresh_ratio
+        self.jobs = {}
+        self._ids = itertools.count(1)
+        self._queue = queue.Queue()
+        self._fee_rate = None  # average fee rate of the template being mined
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self):
+        job_id = str(next(self._ids))
+        with self.lock:
+            self.jobs[job_id] = {"job": job_id, "status": "queued", "restarts": 0, "block": None, "error": None}
+            for old in list(self.jobs)[:-JOB_HISTORY]:
+                if self.jobs[old]["status"] in ("mined", "failed"):
+                    del self.jobs[old]
+        self._queue.put(job_id)
+        return job_id
+
+    def status(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job else None
+
+    def tip_moved(self, tip_hash):
+        self.miner.cancel_stale(tip_hash)
+
+    def tx_added(self, tx):
+        rate = self._fee_rate
+        if rate is not None and tx.fee / len(tx.to_bytes()) >= self.refresh_ratio * rate:
+            print("[*] High-fee tx arrived, refreshing the block template")
+            self.miner.cancel()
+
+    def _run(self):
+        while True:
+            job_id = self._queue.get()
+            try:
+                self._mine_job(self.jobs[job_id])
+            except Exception as e:
+                with self.lock:
+                    self.jobs[job_id].update(status="failed", error=str(e))
+
+    def _mine_job(self, job):
+        while True:
+            with self.lock:
+                block = self.builder.build(self.tip())
+                if block is None:
+                    job.update(status="failed", error="no valid tx")
+                    return
+                job["status"] = "mining"
+            self._fee_rate = sum(tx.fee for tx in block.txs) / sum(len(tx.to_bytes()) for tx in block.txs)
+            mined = self.miner.mine(block, self.difficulty)
+            self._fee_rate = None
+            with self.lock:
+                if mined is not None and mined.prev_hash == self.tip().hash:
+                    if not self.publish(mined):
+                        job.update(status="failed", error="block rejected")
+                        return
+                    job.update(status="mined", block={"index": mined.index, "hash": mined.hash, "txs": len(mined.txs)})
+                    return
+                job["restarts"] += 1
+
+WORK_TTL = 30     # seconds getwork keeps handing out the same template
+WORK_HISTORY = 16  # templates kept so late submissions can still be checked
+
+class WorkCache:
+    """
+    getwork/submitwork for miners running outside the node. get_work()
+    builds a block template (reused until the tip moves or it is WORK_TTL
+    old) and hands out its header prefix and target. submit() checks a
+    nonce against the cached template with a single SHA-256 and publishes
+    the block, holding `lock` like MiningService does; publish() has the
+    final say.
+    """
+    def __init__(self, builder, tip, publish, lock, difficulty=DIFFICULTY, ttl=WORK_TTL):
+        self.builder = builder
+        self.tip = tip
+        self.publish = publish
+        self.lock = lock
+        self.difficulty = difficulty
+        self.ttl = ttl
+        self.templates = OrderedDict()  # work_id -> (block, header prefix)
+        self._current = None
+        self._built = 0
+
+    def get_work(self, now=None):
+        """Work for the current tip, or None if no tx is ready to mine."""
+        now = time.time() if now is None else now
+        with self.lock:
+            tip = self.tip()
+            current = self.templates.get(self._current)
+            if current is None or current[0].prev_hash != tip.hash or now - self._built > self.ttl:
+                block = self.builder.build(tip)
+                if block is None:
+                    return None
+                prefix = block.header_prefix()
+                self._current = hashlib.sha256(prefix).hexdigest()[:16]
+                self._built = now
+                self.templates[self._current] = (block, prefix)
+                while len(self.templates) > WORK_HISTORY:
+                    self.templates.popitem(last=False)
+            block, prefix = self.templates[self._current]
+            return {
+                "work_id": self._current,
+                "prefix": prefix.hex(),
+                "difficulty": self.difficulty,
+                "target": difficulty_target(self.difficulty).hex(),
+                "index": block.index,
+                "prev_hash": block.prev_hash,
+            }
+
+    def submit(self, work_id, nonce):
+        """The published block if nonce solves work_id, else None."""
+        with self.lock:
+            entry = self.templates.get(work_id)
+            if entry is None:
+                print("[!] Reject work: unknown or expired work id"); return None
+            if not 0 <= nonce <= MAX_NONCE:
+                print("[!] Reject work: nonce out of range"); return None
+            block, prefix = entry
+            digest = hashlib.sha256(prefix + NONCE.pack(nonce)).digest()
+            if digest >= difficulty_target(self.difficulty):
+                print("[!] Reject work: hash above target"); return None
+            if block.prev_hash != self.tip().hash:
+                print("[!] Reject work: stale, the chain tip has moved"); return None
+            del self.templates[work_id]
+            block.nonce, block.hash = nonce, digest.hex()
+            block.freeze()
+            if not self.publish(block):
+                print("[!] Reject work: block failed validation"); return None
+            return block
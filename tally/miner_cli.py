@@ -0,0 +1,60 @@
+# tally/miner_cli.py
+# Standalone PoW worker: fetches work from a node's /getwork, searches nonces
+# on a ParallelMiner and posts solutions to /submitwork. Installed as tally-miner.
+import threading, time
+import click
+import requests
+from tally.miner import ParallelMiner
+
+def _fetch_work(node):
+    resp = requests.get(f"{node}/getwork", timeout=10)
+    if resp.status_code == 503:
+        return None
+    resp.raise_for_status()
+    return resp.json()
+
+def _watch(node, miner, work_id, poll, done):
+    # Abandon the search as soon as the node hands out different work (new tip or txs)
+    while not done.wait(poll):
+        try:
+            latest = _fetch_work(node)
+        except requests.RequestException:
+            continue
+        if latest is None or latest['work_id'] != work_id:
+            miner.cancel()
+            return
+
+@click.command()
+@click.option('--node', default='http://127.0.0.1:5000', show_default=True, help='Node RPC URL')
+@click.option('--workers', default=0, type=int, help='Worker processes (default: TALLY_MINER_WORKERS or all cores)')
+@click.option('--poll', default=2.0, show_default=True, help='Seconds between checks for new work')
+def main(node, workers, poll):
+    """Mine blocks for a Tally node from outside its process."""
+    miner = ParallelMiner(workers or None)
+    click.echo(f"Mining for {node} with {miner.workers} workers")
+    while True:
+        try:
+            work = _fetch_work(node)
+        except requests.RequestException as e:
+            click.echo(f"[!] Node unreachable: {e}")
+            time.sleep(poll)
+            continue
+        if work is None:
+            time.sleep(poll)  # nothing to mine yet
+            continue
+        done = threading.Event()
+        threading.Thread(target=_watch, args=(node, miner, work['work_id'], poll, done), daemon=True).start()
+        found = miner.search(bytes.fromhex(work['prefix']), work['difficulty'])
+        done.set()
+        if found is None:
+            continue
+        nonce, block_hash = found
+        resp = requests.post(f"{node}/submitwork", json={"work_id": work['work_id'], "nonce": nonce}, timeout=10)
+        result = resp.json()
+        if result.get('accepted'):
+            click.echo(f"Block #{work['index']} accepted: {block_hash[:16]}...")
+        else:
+            click.echo(f"[!] Solution rejected: {result.get('error')}")
+
+if __name__ == '__main__':
+    main()
@@ -1,17 +1,46 @@
 # tally/network.py
-import socket, threading, json
+import socket, threading, struct
 from .crypto import pubkey_from_bytes, pubkey_bytes, derive_shared_key, encrypt_message, decrypt_message
+from .blockchain import MAX_BLOCK_BYTES
 
-def run_secure_server(priv, pub, host, port, ledger, blockchain):
+# Wire messages are length-prefixed frames holding an encrypted
+# (type byte + binary payload); see codec.py for the payload encoding.
+MSG_BLOCK = 1
+_FRAME_LEN = struct.Struct('>I')
+MAX_FRAME_BYTES = MAX_BLOCK_BYTES + 64  # a full block plus type byte and AES-GCM nonce/tag
+
+def send_frame(sock, payload):
+    sock.sendall(_FRAME_LEN.pack(len(payload)) + payload)
+
+def _recv_exact(sock, n):
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            return None
+        buf += chunk
+    return bytes(buf)
+
+def recv_frame(sock):
+    head = _recv_exact(sock, _FRAME_LEN.size)
+    if head is None:
+        return None
+    n = _FRAME_LEN.unpack(head)[0]
+    if n > MAX_FRAME_BYTES:
+        print(f"[!] Frame of {n} bytes exceeds the limit; dropping peer")
+        return None
+    return _recv_exact(sock, n)
+
+def run_secure_server(priv, pub, host, port, ledger, blockchain, on_block=None):
     s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     s.bind((host, port))
     s.listen(5)
     print(f"[Server] Listening on {host}:{port}")
     while True:
         conn, addr = s.accept()
-        threading.Thread(target=handle_peer, args=(conn, priv, pub, ledger, blockchain)).start()
+        threading.Thread(target=handle_peer, args=(conn, priv, pub, ledger, blockchain, on_block)).start()
 
-def handle_peer(conn, priv, pub, ledger, blockchain):
+def handle_peer(conn, priv, pub, ledger, blockchain, on_block=None):
     try:
         peer_pub_bytes = conn.recv(4096)
         peer_pub = pubkey_from_bytes(peer_pub_bytes)
@@ -20,18 +49,18 @@ def handle_peer(conn, priv, pub, ledger, blockchain):
         print("[Server] Shared key with peer established.")
 
         while True:
-            ct = conn.recv(8192)
+            ct = recv_frame(conn)
             if not ct: break
             msg = decrypt_message(shared_key, ct)
-            msgd = json.loads(msg.decode())
-            if msgd['type'] == 'block':
+            if msg[0] == MSG_BLOCK:
                 from .blockchain import Block, verify_block
-                b = Block.from_dict(msgd['data'])
+                b = Block.from_bytes(msg[1:])
                 print(f"[Server] Received encrypted block: #{b.index} with hash {b.hash[:16]}...")
                 if verify_block(b, blockchain[-1].hash, ledger):
-                    for tx in b.txs: ledger.execute_transaction(tx)
+                    ledger.apply_block(b)
                     blockchain.append(b)
                     print(f"[Server] Block #{b.index} appended!")
+                    if on_block: on_block(b)
                 else:
                     print("[Server] Invalid block received.")
     finally:
@@ -45,9 +74,7 @@ def connect_and_send_block(priv, pub, peer_addr, peer_port, block):
     peer_pub = pubkey_from_bytes(peer_pub_bytes)
     shared_key = derive_shared_key(priv, peer_pub)
     print("[Client] Shared key with peer established.")
-    msg = {'type': 'block', 'data': block.to_dict()}
-    import json
-    msg_bytes = json.dumps(msg).encode()
+    msg_bytes = bytes([MSG_BLOCK]) + block.to_bytes()
     ct = encrypt_message(shared_key, msg_bytes)
-    s.sendall(ct)
-    s.close()
\ No newline at end of file
+    send_frame(s, ct)
+    s.close()
@@ -1,19 +1,22 @@
 # In tally/node.py
 from cryptography.hazmat.primitives import ec
-from flask import Flask, request, jsonify
-from tally.transaction import Transaction
-from decimal import Decimal
+from flask import Flask, Response, request, jsonify
+from tally.transaction import tx_from_dict
+from tally.amount import to_atoms, format_atoms
 from tally.crypto import gen_keypair, gen_ecc_keypair_raw # Import gen_keypair
 from tally.ledger import Ledger # Import Ledger
 from tally.blockchain import make_genesis_block, Block, verify_block # Import make_genesis_block, Block
 import threading
 from .network import run_secure_server  # Import run_secure_server
+from .executor import ParallelExecutor, EXEC_WORKERS
+from .mempool import Mempool
 
 app = Flask(__name__)
 
 # Global variables for blockchain, ledger, and keys (initialized in run_node)
 blockchain = None
 ledger = None
+mempool = None
 net_priv = None
 net_pub = None
 addr = None
@@ -29,14 +32,17 @@ VALID_PREPARES_AND_COMMITS_TO_VALIDATE = PBFT_NODES - PBFT_FAULTY_NODES
 
 
 def run_node(host='127.0.0.1', port=5000):
-    global blockchain, ledger, net_priv, net_pub, addr, priv, node_state # Declare global variables
+    global blockchain, ledger, mempool, net_priv, net_pub, addr, priv, node_state # Declare global variables
     # Initialize keys and genesis block (same as in run_demo)
     priv, pub, addr = gen_keypair()
     net_priv, net_pub = gen_ecc_keypair_raw()
 
-    genesis_balances = {addr: Decimal("1000")}  # Initialize genesis balance
+    genesis_balances = {addr: to_atoms("1000")}  # Initialize genesis balance
     ledger = Ledger(genesis_balances)
-    genesis_block = make_genesis_block()
+    if EXEC_WORKERS:
+        ledger.executor = ParallelExecutor()  # block txs run in parallel by conflict group
+    mempool = Mempool(ledger)
+    genesis_block = make_genesis_block(ledger)
     blockchain = [genesis_block]
     assign_leader()
 
@@ -55,7 +61,7 @@ def run_node(host='127.0.0.1', port=5000):
     # Start secure server in a thread
     threading.Thread(
         target=run_secure_server,
-        args=(net_priv, net_pub, '127.0.0.1', 5008, ledger, blockchain),
+        args=(net_priv, net_pub, '127.0.0.1', 5008, ledger, blockchain, on_new_block),
         daemon=True
     ).start()
 
@@ -63,6 +69,10 @@ def run_node(host='127.0.0.1', port=5000):
 
     app.run(host=host, port=port, debug=True, use_reloader=False)
 
+def on_new_block(block):
+    # Re-check only the mempool queues of accounts this block touched
+    mempool.remove_confirmed(block.txs)
+
 def is_leader():
     global node_state
     return node_state['leader_index'] == NODE_INDEX
@@ -94,9 +104,17 @@ def start_pbft_consensus_messages(block):
     message = {'type': 'pre-prepare', 'block': block.to_dict()}
     broadcast_message(message) # Send message to all other nodes.
 
+def block_from_message(block_data):
+    # Every pBFT phase carries the same block; reuse the frozen copy we already
+    # hold so its bytes, hashes and dict form are not rebuilt each round.
+    current = node_state.get('current_block')
+    if current is not None and current.hash and block_data.get('hash') == current.hash:
+        return current
+    return Block.from_dict(block_data)
+
 def handle_pre_prepare_message(block_data):
     global node_state, blockchain, ledger
-    block = Block.from_dict(block_data)
+    block = block_from_message(block_data)
 
     # Step 1: Consensus - Once we get this we pre-prepare the block and start the voting.
     if verify_block(block, blockchain[-1].hash, ledger):
@@ -110,10 +128,10 @@ def handle_pre_prepare_message(block_data):
 def handle_prepare_message(block_data):
     global node_state, blockchain, ledger, addr
 
-    block = Block.from_dict(block_data)
+    block = block_from_message(block_data)
 
     # Check if we have not already voted in prepare.
-    if addr not in node_state['prepare_votes'] and node_state['current_block'] == block:
+    if addr not in node_state['prepare_votes'] and node_state['current_block'] is block:
 
         if verify_block(block, blockchain[-1].hash, ledger):
             node_state['prepare_votes'].append(addr)
@@ -135,10 +153,10 @@ def handle_prepare_message(block_data):
 def handle_commit_message(block_data):
     global node_state, blockchain, ledger, addr
 
-    block = Block.from_dict(block_data)
+    block = block_from_message(block_data)
 
     # Check if we have not already voted in commit.
-    if addr not in node_state['commit_votes'] and node_state['current_block'] == block:
+    if addr not in node_state['commit_votes'] and node_state['current_block'] is block:
 
         if verify_block(block, blockchain[-1].hash, ledger):
             node_state['commit_votes'].append(addr)
@@ -148,9 +166,9 @@ def handle_commit_message(block_data):
 
                 node_state['committed'] = True
 
-                for tx in block.txs:
-                    ledger.execute_transaction(tx)
+                ledger.apply_block(block)
                 blockchain.append(block)
+                on_new_block(block)
                 print(f"Block #{block.index} appended!")
         else:
             print("Consensus failed: Invalid block received.")
@@ -193,8 +211,8 @@ def new_transaction():
     global ledger, blockchain  # Access the global variables
     tx_data = request.get_json()
     try:
-        tx = Transaction.from_dict(tx_data)
-        if ledger.validate_transaction(tx):
+        tx = tx_from_dict(tx_data)
+        if mempool.add(tx.freeze()):
             # Broadcast transaction (implement your broadcast logic here)
             print("Broadcasting transaction:", tx_data)  # For debugging
             # broadcast_transaction(tx) # Implement the broadcast_transaction function
@@ -212,9 +230,9 @@ def new_block():
     try:
         block = Block.from_dict(block_data)
         if verify_block(block, blockchain[-1].hash, ledger):
-            for tx in block.txs:
-                ledger.execute_transaction(tx)
+            ledger.apply_block(block)
             blockchain.append(block)
+            on_new_block(block)
             print(f"Block #{block.index} added via RPC!")
             return jsonify({'message': 'Block accepted'}), 201
         else:
@@ -226,14 +244,15 @@ def new_block():
 @app.route('/balance/<address>', methods=['GET'])
 def get_balance(address):
     global ledger # Access the global variable
-    balance = ledger.balances.get(address, Decimal("0"))
-    return jsonify({'address': address, 'balance': str(balance)}), 200
+    balance = ledger.balances.get(address, 0)
+    return jsonify({'address': address, 'balance': format_atoms(balance)}), 200
 
 @app.route('/chain', methods=['GET'])
 def get_chain():
     global blockchain # Access the global variable
-    chain_data = [block.to_dict() for block in blockchain]
-    return jsonify(chain_data), 200
+    # Blocks on the chain are frozen, so each to_json() is a cache lookup
+    chain_json = '[' + ','.join(block.to_json() for block in blockchain) + ']'
+    return Response(chain_json, status=200, mimetype='application/json')
 
 @app.route('/address', methods=['GET'])
 def get_address():
@@ -0,0 +1,75 @@
+# tally/pending.py
+from .ledger import tx_cost
+
+class PendingState:
+    """
+    How each sender's account will look once its queued mempool txs are
+    mined: the next nonce and the total queued spend. Only the sender's own
+    queue counts (pending incoming transfers do not), so any prefix of one
+    sender's queue stays valid whatever else is mined with it, and a tx can
+    be dropped from the tail of a queue in O(1).
+    """
+    def __init__(self, ledger):
+        self.ledger = ledger
+        self.queued = {}  # sender -> [next nonce, queued spend in atoms]
+
+    def reset(self):
+        """Forget every queued tx (e.g. after the confirmed ledger moved)."""
+        self.queued.clear()
+
+    def nonce(self, addr):
+        q = self.queued.get(addr)
+        return q[0] if q else self.ledger.nonces.get(addr, 0)
+
+    def balance(self, addr):
+        q = self.queued.get(addr)
+        return self.ledger.balances.get(addr, 0) - (q[1] if q else 0)
+
+    def check(self, tx, replacing=None):
+        """
+        Validate tx against the confirmed ledger after the sender's queued
+        txs, or, with replacing, as a stand-in for that queued tx.
+        """
+        q = self.queued.get(tx.sender_addr)
+        if not q:
+            return self.ledger.validate_transaction(tx)
+        view = self.ledger.overlay()
+        if replacing is None:
+            view.nonces[tx.sender_addr] = q[0]
+            view.balances[tx.sender_addr] -= q[1]
+        else:
+            # Costs are positive, so if the whole queue stays affordable so does every prefix
+            view.nonces[tx.sender_addr] = replacing.nonce
+            view.balances[tx.sender_addr] -= q[1] - tx_cost(replacing)
+        return view.validate_transaction(tx)
+
+    def add(self, tx):
+        """Queue tx if it is valid after everything the sender already queued."""
+        if not self.check(tx):
+            return False
+        q = self.queued.setdefault(tx.sender_addr, [tx.nonce, 0])
+        q[0] += 1
+        q[1] += tx_cost(tx)
+        return True
+
+    def replace(self, old, new):
+        """Swap queued tx old for new (same sender and nonce) if the queue stays valid."""
+        if not self.check(new, replacing=old):
+            return False
+        self.queued[new.sender_addr][1] += tx_cost(new) - tx_cost(old)
+        return True
+
+    def remove_head(self, tx):
+        """Unqueue tx, the oldest queued for its sender, once it is confirmed or stale."""
+        q = self.queued[tx.sender_addr]
+        q[1] -= tx_cost(tx)
+        if not q[1]:
+            del self.queued[tx.sender_addr]
+
+    def remove(self, tx):
+        """Unqueue tx, which must be the last one queued for its sender."""
+        q = self.queued[tx.sender_addr]
+        q[0] -= 1
+        q[1] -= tx_cost(tx)
+        if not q[1]:  # every queued tx pays a fee, so zero spend means an empty queue
+            del self.queued[tx.sender_addr]
@@ -5,12 +5,20 @@ Created on Tue Jul  1 15:45:36 2025
 @author: Lucian
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from tally.ledger import Ledger
-from tally.blockchain import Block, make_genesis_block, mine_block, verify_block
-from tally.transaction import Transaction
-
-from decimal import Decimal
+from tally.blockchain import make_genesis_block, verify_block
+from tally.transaction import tx_from_dict
+from tally.miner import ParallelMiner, MiningService, WorkCache
+from tally.executor import ParallelExecutor, EXEC_WORKERS
+from tally.mempool import Mempool
+from tally.admission import AdmissionPipeline
+from tally.template import BlockTemplateBuilder
+from tally.storage import BlockStore
+from tally.snapshot import Snapshot, load_snapshot, write_snapshot
+import os, threading
+
+from tally.amount import to_atoms, format_atoms
 
 app = Flask(__name__)
 
@@ -26,72 +34,190 @@ try:
 except Exception:
     print("Genesis balances not found; expect trouble if you didn't set them manually!")
 
-ledger = Ledger({k: Decimal(str(v)) for k, v in genesis_balances.items()})
-blockchain = [make_genesis_block()]
-mempool = []
+ledger = Ledger({k: to_atoms(v) for k, v in genesis_balances.items()})
+blockchain = [make_genesis_block(ledger)]
+
+# Mined blocks are appended to a binary chain file and replayed on restart.
+# Every SNAPSHOT_INTERVAL blocks the ledger is also written to a snapshot;
+# on restart it is mmapped and only the blocks after it are replayed.
+SNAPSHOT_FILE = 'ledger.snap'
+SNAPSHOT_INTERVAL = 100
+chain_store = BlockStore('chain.dat')
+stored_blocks = chain_store.load()
+if os.path.exists(SNAPSHOT_FILE):
+    try:
+        snap_ledger, snap = load_snapshot(SNAPSHOT_FILE)
+    except ValueError as e:
+        print(f"[!] Ignoring snapshot: {e}")
+        snap = None
+    tip = stored_blocks[snap.height - 1] if snap and 0 < snap.height <= len(stored_blocks) else None
+    # Only use a snapshot of the stored chain: same tip block and same state root
+    if tip is not None and tip.hash == snap.block_hash and tip.state_root == snap.state_root:
+        blockchain += stored_blocks[:snap.height]
+        stored_blocks = stored_blocks[snap.height:]
+        ledger = snap_ledger
+        print(f"Loaded ledger snapshot at height {snap.height}.")
+        # Undo records for the snapshotted blocks, so they can still be rolled back
+        undo = chain_store.load_undo()[:snap.height]
+        if len(undo) == snap.height and all(u.height == i for i, u in enumerate(undo)):
+            ledger.undo_log = undo[-ledger.undo_depth:] if ledger.undo_depth else []
+        else:
+            print("[!] chain.dat.undo does not match chain.dat; blocks before the snapshot cannot be rolled back")
+if EXEC_WORKERS:
+    ledger.executor = ParallelExecutor()  # block txs run in parallel by conflict group
+for stored in stored_blocks:
+    if not verify_block(stored, blockchain[-1].hash, ledger):
+        print(f"[!] Stored block #{stored.index} is invalid; ignoring the rest of chain.dat")
+        break
+    ledger.apply_block(stored)
+    blockchain.append(stored)
+if len(blockchain) > 1:
+    print(f"Chain restored to height {len(blockchain) - 1} from chain.dat.")
+mempool = Mempool(ledger)  # admission checks the sender's queued txs too (mempool.pending)
+template_builder = BlockTemplateBuilder(mempool, ledger)
+miner = ParallelMiner()  # worker count from TALLY_MINER_WORKERS, defaults to all cores
+# Request threads and the mining thread share the node state; every write holds this lock
+state_lock = threading.RLock()
+
+def publish_block(newblk):
+    # Called by the mining service and getwork with state_lock held; the
+    # block is only appended and stored once it verifies and applies
+    if not verify_block(newblk, blockchain[-1].hash, ledger):
+        return False
+    if not ledger.apply_block(newblk):
+        print(f"[!] Block #{newblk.index} failed to apply")
+        return False
+    blockchain.append(newblk)
+    chain_store.append(newblk, ledger.undo_log[-1])
+    if ledger.height % SNAPSHOT_INTERVAL == 0:
+        write_snapshot(SNAPSHOT_FILE, ledger, newblk.hash)
+        ledger.state = Snapshot(SNAPSHOT_FILE).state_tree()  # frees the in-memory tree nodes
+    mempool.remove_confirmed(newblk.txs)
+    mining.tip_moved(newblk.hash)  # a local job on the old tip can never be accepted
+    print(f"Block #{newblk.index} mined with {len(newblk.txs)} txs.")
+    return True
+
+mining = MiningService(miner, template_builder, lambda: blockchain[-1], publish_block, state_lock)
+work = WorkCache(template_builder, lambda: blockchain[-1], publish_block, state_lock)  # external miners
+# /sendtx txs are signature-checked in batches across TALLY_VERIFY_WORKERS processes
+admission = AdmissionPipeline(mempool, state_lock, on_admit=mining.tx_added)
 
 # ===== REST API =====
 
+# ?pending=1 answers as if the sender's queued mempool txs were mined.
+# Reads hold state_lock too: on a snapshot-loaded ledger a lookup can fault
+# the account into the table, a write that must not race apply_block.
+
 @app.route("/balance/<address>")
 def balance(address):
-    amt = str(ledger.balances.get(address, 0))
+    with state_lock:
+        if request.args.get('pending'):
+            amt = format_atoms(mempool.pending.balance(address))
+        else:
+            amt = format_atoms(ledger.balances.get(address, 0))
     return jsonify({"balance": amt})
 
 @app.route("/nonce/<address>")
 def nonce(address):
-    n = int(ledger.nonces.get(address, 0))
+    with state_lock:
+        if request.args.get('pending'):
+            n = mempool.pending.nonce(address)
+        else:
+            n = int(ledger.nonces.get(address, 0))
     return jsonify({"nonce": n})
 
+@app.route("/pubkey/<address>")
+def pubkey(address):
+    # Once registered, txs from this address may omit public_key
+    with state_lock:
+        registered = address in ledger.pubkeys
+    return jsonify({"registered": registered})
+
 @app.route("/sendtx", methods=['POST'])
 def sendtx():
     global blockchain, ledger, mempool 
     tx_data = request.json
     try:
-        tx = Transaction.from_dict(tx_data)
-        # Validate signature and basics
-        if ledger.validate_transaction(tx):
-            mempool.append(tx)
+        tx = tx_from_dict(tx_data).freeze()
+        # Validated against the confirmed ledger plus the sender's queued txs
+        if admission.submit(tx):
             return jsonify({"accepted": True, "error": None})
         else:
             return jsonify({"accepted": False, "error": "invalid"})
+    except TimeoutError:
+        return jsonify({"accepted": False, "error": "admission timed out"})
     except Exception as e:
         return jsonify({"accepted": False, "error": str(e)})
 
 @app.route("/mine", methods=['POST'])
 def mine():
-    global blockchain, ledger, mempool  # <--- MUST be first in the function!
-    if not mempool:
-        return jsonify({"mined": False, "error": "no tx"})
-    temp_ledger = ledger.clone()
-    txs = []
-    for tx in mempool:
-        if temp_ledger.execute_transaction(tx):
-            txs.append(tx)
-    if not txs:
-        return jsonify({"mined": False, "error": "no valid tx"})
-
-    lastblock = blockchain[-1]
-    newblk = Block(
-        index=lastblock.index + 1,
-        prev_hash=lastblock.hash,
-        txs=txs
-    )
-    newblk = mine_block(newblk)
-    blockchain.append(newblk)
-    for tx in txs:
-        ledger.execute_transaction(tx)
-    mempool = []
-    return jsonify({"mined": True, "block": newblk.to_dict()})
+    # Queue a job; the block is built and mined in the background (see GET /mine/<job>)
+    with state_lock:
+        mempool.expire()
+        if not mempool:
+            return jsonify({"mined": False, "error": "no tx"})
+    return jsonify({"job": mining.submit()}), 202
+
+@app.route("/mine/<job_id>")
+def mine_status(job_id):
+    job = mining.status(job_id)
+    if job is None:
+        return jsonify({"error": "unknown job"}), 404
+    return jsonify(job)
+
+@app.route("/getwork")
+def getwork():
+    # Header prefix + target for tally-miner; the nonce is the last 8 header bytes
+    w = work.get_work()
+    if w is None:
+        return jsonify({"error": "no valid tx"}), 503
+    return jsonify(w)
+
+@app.route("/submitwork", methods=['POST'])
+def submitwork():
+    data = request.json
+    try:
+        blk = work.submit(data['work_id'], int(data['nonce']))
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({"accepted": False, "error": f"bad request: {e}"}), 400
+    if blk is None:
+        return jsonify({"accepted": False, "error": "rejected"})
+    return jsonify({"accepted": True, "block": {"index": blk.index, "hash": blk.hash}})
 
 @app.route("/block/<int:bidx>")
 def block_by_idx(bidx):
     if 0 <= bidx < len(blockchain):
-        return jsonify(blockchain[bidx].to_dict())
+        return Response(blockchain[bidx].to_json(), mimetype='application/json')
     return jsonify({"error": "out of range"})
 
 @app.route("/mempool")
 def get_mempool():
-    return jsonify([tx.to_dict() for tx in mempool])
+    # Admission and mining change the pool from other threads
+    with state_lock:
+        body = '[' + ','.join(tx.to_json() for tx in mempool) + ']'
+    return Response(body, mimetype='application/json')
+
+@app.route("/mempool/stats")
+def mempool_stats():
+    with state_lock:
+        stats = mempool.stats()
+    return jsonify(stats)
+
+@app.route("/stateproof/<address>")
+def state_proof(address):
+    # state_root() flushes the ledger's dirty set, which block application also writes
+    with state_lock:
+        root, value, siblings = ledger.prove(address)
+        proof = {
+            "state_root": root,
+            "height": ledger.height,
+            "balance": format_atoms(ledger.balances.get(address, 0)),
+            "nonce": int(ledger.nonces.get(address, 0)),
+            "stake": format_atoms(ledger.stakes.get(address, 0)),
+            "leaf": value.hex() if value else None,
+            "siblings": [s.hex() for s in siblings]
+        }
+    return jsonify(proof)
 
 @app.route("/")
 def home():
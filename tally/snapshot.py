@@ -0,0 +1,140 @@
+# tally/snapshot.py
+# On-disk ledger snapshot: a header, a sorted address table, fixed-width
+# balance/nonce/stake columns, the registered public keys (raw DER) and the
+# state tree's nodes. Loading mmaps the file and serves lookups by
+# binary search, so a restarted node can answer right away and only replay
+# the blocks after the snapshot.
+import os, sys, mmap, struct, base64
+from array import array
+from .statetree import StateTree, RECORD_SIZE
+
+MAGIC = b'TLYSNAP\x00'
+SNAPSHOT_VERSION = 3
+# magic, version, height, block_hash, state_root, count, total_supply, fee_collected, circulating, staked
+_HEADER = struct.Struct('<8sBQ32s32sQQQQQ')
+_U64 = struct.Struct('<Q')  # offsets and columns are little-endian u64
+
+def _column(values):
+    col = array('Q', values)
+    if sys.byteorder == 'big':
+        col.byteswap()
+    return col.tobytes()
+
+def _offsets(blobs):
+    offsets, pos = [0], 0
+    for b in blobs:
+        pos += len(b)
+        offsets.append(pos)
+    return offsets
+
+def write_snapshot(path, ledger, block_hash):
+    """Write ledger state as of its current height; block_hash is the tip it belongs to."""
+    root = ledger.state_root()
+    table = ledger.accounts
+    table.materialize()
+    order = sorted(range(len(table)), key=lambda i: table.address(i).encode())
+    addrs = [table.address(i) for i in order]
+    blobs = [a.encode() for a in addrs]
+    keys = [base64.b64decode(ledger.pubkeys.get(a) or '') for a in addrs]
+    header = _HEADER.pack(
+        MAGIC, SNAPSHOT_VERSION, ledger.height, bytes.fromhex(block_hash), bytes.fromhex(root), len(order),
+        ledger.total_supply, ledger.fee_collected, ledger.circulating, ledger.staked
+    )
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(header)
+        f.write(_column(_offsets(blobs)))
+        f.write(b''.join(blobs))
+        for col in (table.balance, table.nonce, table.stake):
+            f.write(_column(col[i] for i in order))
+        f.write(_column(_offsets(keys)))  # empty entry = no key registered
+        f.write(b''.join(keys))
+        for record in ledger.state.records():  # the rest of the file
+            f.write(record)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)  # never leave a half-written snapshot behind
+
+class Snapshot:
+    """Read-only, memory-mapped view of a snapshot file."""
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, self.height, block_hash, state_root, self.count, self.total_supply,
+         self.fee_collected, self.circulating, self.staked) = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != SNAPSHOT_VERSION:
+            raise ValueError(f"{path} is not a version {SNAPSHOT_VERSION} ledger snapshot")
+        self.block_hash = block_hash.hex()
+        self.state_root = state_root.hex()
+        self._offsets = _HEADER.size
+        self._blob = self._offsets + 8 * (self.count + 1)
+        self._cols = self._blob + self._u64(self._offsets, self.count)
+        self._key_offsets = self._cols + 3 * 8 * self.count
+        self._key_blob = self._key_offsets + 8 * (self.count + 1)
+        self._tree = self._key_blob + self._u64(self._key_offsets, self.count)
+        if (len(self._mm) - self._tree) % RECORD_SIZE or self.state_tree().root() != self.state_root:
+            raise ValueError(f"{path}: state tree does not match the snapshot's state root")
+
+    def _u64(self, base, i):
+        return _U64.unpack_from(self._mm, base + 8 * i)[0]
+
+    def _raw_address(self, i):
+        return self._mm[self._blob + self._u64(self._offsets, i):self._blob + self._u64(self._offsets, i + 1)]
+
+    def address(self, i):
+        return self._raw_address(i).decode()
+
+    def pubkey(self, i):
+        """Registered public key of row i (base64 DER), or None."""
+        start, end = self._u64(self._key_offsets, i), self._u64(self._key_offsets, i + 1)
+        if start == end:
+            return None
+        return base64.b64encode(self._mm[self._key_blob + start:self._key_blob + end]).decode()
+
+    def find(self, addr):
+        """Row of addr in the sorted table (binary search), or None."""
+        key = addr.encode()
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._raw_address(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo if lo < self.count and self._raw_address(lo) == key else None
+
+    def account(self, i):
+        """(balance, nonce, stake) of row i."""
+        return tuple(self._u64(self._cols + 8 * self.count * c, i) for c in range(3))
+
+    def column(self, c):
+        start = self._cols + 8 * self.count * c
+        col = array('Q')
+        col.frombytes(self._mm[start:start + 8 * self.count])
+        if sys.byteorder == 'big':
+            col.byteswap()
+        return col
+
+    def state_tree(self):
+        """The persisted state tree; its nodes are read from the file as they are used."""
+        return StateTree.load(self._mm, self._tree, (len(self._mm) - self._tree) // RECORD_SIZE)
+
+    def close(self):
+        self._mm.close()
+
+def load_snapshot(path):
+    """Ledger backed lazily by the snapshot at path (accounts load on first use)."""
+    from .ledger import Ledger
+    from .accounts import KeyRegistry
+    snap = Snapshot(path)
+    ledger = Ledger({})
+    ledger.accounts.base = snap
+    ledger.pubkeys = KeyRegistry(snap)
+    ledger.total_supply = snap.total_supply
+    ledger.fee_collected = snap.fee_collected
+    ledger.circulating = snap.circulating
+    ledger.staked = snap.staked
+    ledger.height = snap.height
+    ledger.state = snap.state_tree()  # no rehash of the accounts
+    return ledger, snap
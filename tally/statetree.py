@@ -0,0 +1,182 @@
+# tally/statetree.py
+import hashlib, struct
+from . import codec
+
+EMPTY_HASH = b'\x00' * 32
+EMPTY_ROOT = EMPTY_HASH.hex()
+
+def account_leaf(addr, balance, nonce, stake):
+    """Value committed for an account: hash of (address, balance, nonce, stake)."""
+    return hashlib.sha256(codec.var_str(addr) + codec.u64(balance) + codec.u64(nonce) + codec.u64(stake)).digest()
+
+def _key(addr):
+    return hashlib.sha256(addr.encode()).digest()
+
+def _bit(key, depth):
+    return (key[depth >> 3] >> (7 - (depth & 7))) & 1
+
+def _leaf_hash(key, value):
+    return hashlib.sha256(b'\x00' + key + value).digest()
+
+def _node_hash(left, right):
+    return hashlib.sha256(b'\x01' + (left.hash if left else EMPTY_HASH) + (right.hash if right else EMPTY_HASH)).digest()
+
+class _Leaf:
+    __slots__ = ('key', 'value', 'hash')
+    def __init__(self, key, value):
+        self.key, self.value, self.hash = key, value, _leaf_hash(key, value)
+
+class _Node:
+    __slots__ = ('left', 'right', 'hash')
+    def __init__(self, left, right):
+        self.left, self.right, self.hash = left, right, _node_hash(left, right)
+
+# Stored nodes are fixed-size records, children before parents (the root is last).
+# Child refs are record index + 1; 0 is an empty subtree.
+_LEAF_RECORD = struct.Struct('<B32s32s32s')  # 0, hash, key, value
+_NODE_RECORD = struct.Struct('<B32sQQ48x')   # 1, hash, left ref, right ref
+RECORD_SIZE = _LEAF_RECORD.size
+
+class _NodeStore:
+    """Read-only node records in a buffer (a snapshot's mmap) at offset."""
+    def __init__(self, buf, offset):
+        self.buf, self.offset = buf, offset
+
+    def ref(self, r):
+        return _Stored(self, r - 1) if r else None
+
+    def load(self, i):
+        # Each node is rehashed as it is read, so the root authenticates the whole file
+        pos = self.offset + RECORD_SIZE * i
+        if self.buf[pos] == 0:
+            _, h, key, value = _LEAF_RECORD.unpack_from(self.buf, pos)
+            node = _Leaf(key, value)
+        else:
+            _, h, left, right = _NODE_RECORD.unpack_from(self.buf, pos)
+            node = _Node(self.ref(left), self.ref(right))
+        if node.hash != h:
+            raise ValueError(f"state tree node {i} does not match its hash")
+        return node
+
+class _Stored:
+    """A subtree still on disk; it is read one level at a time when an update or proof walks into it."""
+    __slots__ = ('store', 'i', 'hash')
+    def __init__(self, store, i):
+        pos = store.offset + RECORD_SIZE * i + 1
+        self.store, self.i, self.hash = store, i, bytes(store.buf[pos:pos + 32])
+
+def _resolve(node):
+    return node.store.load(node.i) if isinstance(node, _Stored) else node
+
+def _records(node, count):
+    # Post-order records of a subtree; returns its ref
+    node = _resolve(node)
+    if node is None:
+        return 0
+    if isinstance(node, _Leaf):
+        yield _LEAF_RECORD.pack(0, node.hash, node.key, node.value)
+    else:
+        left = yield from _records(node.left, count)
+        right = yield from _records(node.right, count)
+        yield _NODE_RECORD.pack(1, node.hash, left, right)
+    count[0] += 1
+    return count[0]
+
+def _insert(node, key, value, depth):
+    node = _resolve(node)
+    if node is None:
+        return _Leaf(key, value)
+    if isinstance(node, _Leaf):
+        if node.key == key:
+            return _Leaf(key, value)
+        # split: push the existing leaf down until the two keys diverge
+        if _bit(node.key, depth) != _bit(key, depth):
+            new = _Leaf(key, value)
+            return _Node(node, new) if _bit(key, depth) else _Node(new, node)
+        child = _insert(node, key, value, depth + 1)
+        return _Node(None, child) if _bit(key, depth) else _Node(child, None)
+    if _bit(key, depth):
+        return _Node(node.left, _insert(node.right, key, value, depth + 1))
+    return _Node(_insert(node.left, key, value, depth + 1), node.right)
+
+def _delete(node, key, depth):
+    node = _resolve(node)
+    if node is None:
+        return None
+    if isinstance(node, _Leaf):
+        return None if node.key == key else node
+    if _bit(key, depth):
+        left, right = node.left, _delete(node.right, key, depth + 1)
+    else:
+        left, right = _delete(node.left, key, depth + 1), node.right
+    # a subtree holding a single leaf is represented by that leaf
+    if left is None and (right is None or isinstance(_resolve(right), _Leaf)):
+        return right
+    if right is None and isinstance(_resolve(left), _Leaf):
+        return left
+    return _Node(left, right)
+
+class StateTree:
+    """
+    Sparse Merkle tree over sha256(address) -> account_leaf(...), in the
+    compact form where a subtree holding one leaf is that leaf and empty
+    subtrees hash to zeros. Nodes are immutable and updates copy only the
+    path they touch (O(log n) hashes), so copy() is O(1) and an old tree
+    stays valid as a snapshot of an earlier root.
+
+    records() serializes the nodes and load() reopens them from a buffer
+    without rehashing; loaded nodes are only read in as they are used.
+
+    Memory: an in-memory tree holds about 2 nodes per account, roughly 400
+    bytes per account in all, several times the AccountTable columns. A
+    tree loaded from a snapshot only keeps the paths updated since, about
+    40 bytes per account at 50k accounts after 1000 updates. The node
+    therefore reloads its tree from every snapshot it writes.
+    """
+    def __init__(self, root=None):
+        self._root = root
+
+    @classmethod
+    def load(cls, buf, offset, count):
+        """Tree over count records written by records(), starting at buf[offset]."""
+        return cls(_Stored(_NodeStore(buf, offset), count - 1) if count else None)
+
+    def records(self):
+        """Fixed-size (RECORD_SIZE) node records, root last."""
+        yield from _records(self._root, [0])
+
+    def root(self):
+        return self._root.hash.hex() if self._root else EMPTY_ROOT
+
+    def copy(self):
+        return StateTree(self._root)
+
+    def set(self, addr, value):
+        self._root = _insert(self._root, _key(addr), value, 0)
+
+    def remove(self, addr):
+        self._root = _delete(self._root, _key(addr), 0)
+
+    def prove(self, addr):
+        """(value or None, sibling hashes from the root down) for addr."""
+        key, node, siblings, depth = _key(addr), _resolve(self._root), [], 0
+        while isinstance(node, _Node):
+            if _bit(key, depth):
+                siblings.append(node.left.hash if node.left else EMPTY_HASH)
+                node = node.right
+            else:
+                siblings.append(node.right.hash if node.right else EMPTY_HASH)
+                node = node.left
+            node = _resolve(node)
+            depth += 1
+        value = node.value if isinstance(node, _Leaf) and node.key == key else None
+        return value, siblings
+
+def verify_proof(root, addr, value, siblings):
+    """Check that addr maps to value under the hex root, given prove()'s siblings."""
+    key = _key(addr)
+    h = _leaf_hash(key, value)
+    for depth in reversed(range(len(siblings))):
+        sib = siblings[depth]
+        h = hashlib.sha256(b'\x01' + (sib + h if _bit(key, depth) else h + sib)).digest()
+    return h.hex() == root
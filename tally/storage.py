@@ -0,0 +1,43 @@
+# tally/storage.py
+import os
+from . import codec
+from .blockchain import Block
+from .ledger import UndoRecord
+
+class BlockStore:
+    """
+    Append-only chain file: one length-prefixed binary block per record
+    (see Block.to_bytes). Genesis is not stored; it is rebuilt on start.
+    Undo records, when given, go to a sidecar file (<path>.undo) in the
+    same order so applied blocks can be unwound after a restart.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.undo_path = path + '.undo'
+
+    def append(self, block, undo=None):
+        self._append(self.path, block.to_bytes())
+        if undo is not None:
+            self._append(self.undo_path, undo.to_bytes())
+
+    def load(self):
+        return [Block.from_bytes(b) for b in self._records(self.path)]
+
+    def load_undo(self):
+        return [UndoRecord.from_bytes(b) for b in self._records(self.undo_path)]
+
+    def _append(self, path, data):
+        with open(path, 'ab') as f:
+            f.write(codec.var_bytes(data, 4))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _records(self, path):
+        if not os.path.exists(path):
+            return []
+        with open(path, 'rb') as f:
+            r = codec.Reader(f.read())
+        records = []
+        while r.pos < len(r.data):
+            records.append(r.var_bytes(4))
+        return records
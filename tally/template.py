@@ -0,0 +1,48 @@
+# tally/template.py
+import time
+from .blockchain import Block, MAX_BLOCK_BYTES, BLOCK_OVERHEAD
+
+MAX_BLOCK_TXS = 5000
+MAX_ASSEMBLY_TIME = 1.0  # seconds spent picking txs before the template is closed
+
+class BlockTemplateBuilder:
+    """
+    Assembles the next (unmined) block from a Mempool. Txs are taken
+    greedily by fee rate (Mempool.select keeps each sender's nonces in
+    order) and executed on one overlay of the confirmed ledger, which also
+    yields the block's state root. Once a sender has a tx that does not fit
+    or fails, the rest of its queue is skipped. Assembly stops at the byte,
+    tx count or time limit.
+    """
+    def __init__(self, mempool, ledger, max_bytes=MAX_BLOCK_BYTES, max_txs=MAX_BLOCK_TXS, max_time=MAX_ASSEMBLY_TIME):
+        self.mempool = mempool
+        self.ledger = ledger
+        self.max_bytes = max_bytes
+        self.max_txs = max_txs
+        self.max_time = max_time
+
+    def build(self, prev_block):
+        """Block on top of prev_block with its state_root set, or None if no tx fits."""
+        deadline = time.monotonic() + self.max_time
+        view = self.ledger.overlay()
+        txs, skipped = [], set()
+        size = BLOCK_OVERHEAD
+        for tx in self.mempool.select():
+            if len(txs) >= self.max_txs or time.monotonic() > deadline:
+                break
+            if tx.sender_addr in skipped:
+                continue
+            tx_size = 4 + len(tx.to_bytes())
+            if size + tx_size > self.max_bytes or not view.execute_transaction(tx):
+                skipped.add(tx.sender_addr)
+                continue
+            txs.append(tx)
+            size += tx_size
+        if not txs:
+            return None
+        return Block(
+            index=prev_block.index + 1,
+            prev_hash=prev_block.hash,
+            txs=txs,
+            state_root=view.state_root()
+        )
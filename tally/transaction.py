@@ -1,27 +1,203 @@
 # tally/transaction.py
-from decimal import Decimal
+import hashlib
 import json
-from .crypto import load_public_key
-from cryptography.hazmat.primitives import serialization
+import sys
+import threading
+from collections import OrderedDict
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.hazmat.primitives import hashes
+from .crypto import load_public_key, parse_public_key
+from . import codec
+from .amount import to_atoms, format_atoms, check_atoms
 import base64
 
-class Transaction:
-    def __init__(self, sender_addr, recipient_addr, amount, nonce, fee=Decimal("0.0001"), new_account_addr=None, signature=None,public_key=None):
-        self.sender_addr = sender_addr
-        self.recipient_addr = recipient_addr
-        self.amount = Decimal(str(amount))
-        self.nonce = nonce
-        self.fee = Decimal(str(fee))
-        self.new_account_addr = new_account_addr
-        self.signature = signature
-        self.public_key = public_key
+class Freezable:
+    """
+    Objects that become immutable once final (mined block, admitted tx).
+    After freeze() any attribute assignment raises, and derived forms
+    (bytes, dict, JSON, hashes) are computed once and served from a cache.
+    """
+    __slots__ = ()
+    _frozen = False
+    _cache = None
+
+    def __setattr__(self, name, value):
+        if self._frozen:
+            raise AttributeError(f"{type(self).__name__} is frozen; cannot set {name}")
+        object.__setattr__(self, name, value)
+
+    def __setstate__(self, state):
+        # Unpickling would otherwise go through __setattr__, which a frozen object refuses
+        attrs, slots = state if isinstance(state, tuple) else (state, None)
+        for source in (attrs, slots):
+            for name, value in (source or {}).items():
+                object.__setattr__(self, name, value)
+
+    def freeze(self):
+        if not self._frozen:
+            object.__setattr__(self, '_frozen', True)
+        return self
+
+    def _cached(self, key, compute):
+        if not self._frozen:
+            return compute()
+        if self._cache is None:
+            object.__setattr__(self, '_cache', {})  # only once something is asked for
+        try:
+            return self._cache[key]
+        except KeyError:
+            value = self._cache[key] = compute()
+            return value
+
+    def to_json(self):
+        # Callers must not mutate the dict returned by to_dict() on a frozen object
+        return self._cached('json', lambda: json.dumps(self.to_dict()))
+
+DEFAULT_FEE = to_atoms("0.0001")
+MAX_BATCH_OUTPUTS = 10000  # ~520 KB of outputs, so a full batch still fits in a block
+BATCH_TX_TAG = 0xB1  # first byte of a BatchTransaction encoding; a Transaction starts with CODEC_VERSION
+SIG_ALGO = ec.ECDSA(hashes.SHA256())  # every tx is signed with ECDSA over SHA-256
+SIG_CACHE_SIZE = 100000  # txids remembered as correctly signed
+
+class SignatureCache:
+    """
+    Bounded LRU of txids whose signature already verified. The txid hashes
+    the signed body together with the signature and public key, so a hit
+    means this exact tx was checked before and ECDSA can be skipped.
+    Failures are not cached. Request, admission and mining threads share
+    it, so lookups, promotion and eviction hold _lock; ECDSA runs outside it.
+    """
+    def __init__(self, size=SIG_CACHE_SIZE):
+        self.size = size
+        self._verified = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def verify(self, tx, public_key=None):
+        """True if tx is correctly signed; raises like verify_signature() if not."""
+        key = self._key(tx, public_key)
+        with self._lock:
+            if key in self._verified:
+                self._verified.move_to_end(key)
+                self.hits += 1
+                return True
+            self.misses += 1
+        tx.verify_signature(public_key)
+        self._remember(key)
+        return True
+
+    def record(self, tx, public_key=None):
+        """Mark tx as correctly signed after verifying it elsewhere (e.g. AdmissionPipeline's workers)."""
+        self._remember(self._key(tx, public_key))
+
+    def _key(self, tx, public_key):
+        # A tx without its own key is checked against public_key, which the txid does not cover
+        return tx.txid() if tx.public_key else (tx.txid(), public_key)
+
+    def _remember(self, key):
+        with self._lock:
+            self._verified[key] = True
+            self._verified.move_to_end(key)
+            if len(self._verified) > self.size:
+                self._verified.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._verified.clear()
+            self.hits = self.misses = 0
+
+    def __len__(self):
+        return len(self._verified)
+
+sig_cache = SignatureCache()  # shared by every ledger in this process
+
+U64_MAX = 2**64 - 1
+MAX_ADDR_BYTES = 0xFFFF  # var_str length prefix
+
+# Field checks, so a tx that could not be encoded (and so neither signed nor
+# hashed) is refused when it is built rather than wherever it is first encoded
+def _u64(value, field):
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise TypeError(f"{field} must be an int, got {value!r}")
+    if not 0 <= value <= U64_MAX:
+        raise ValueError(f"{field} must be between 0 and {U64_MAX}, got {value}")
+    return value
+
+def _signature(sig):
+    if sig is not None and len(sig) > MAX_ADDR_BYTES:
+        raise ValueError(f"signature is longer than {MAX_ADDR_BYTES} bytes")
+    return sig
+
+def _intern(s, field='address'):
+    if s is None:
+        return s
+    if not isinstance(s, str):
+        raise TypeError(f"{field} must be a str, got {s!r}")
+    if len(s.encode()) > MAX_ADDR_BYTES:
+        raise ValueError(f"{field} is longer than {MAX_ADDR_BYTES} bytes")
+    return sys.intern(s) if s else s
+
+def _address(s, field='address'):
+    # Sender and recipients must be real accounts; only new_account_addr is optional
+    if s is None or s == '':
+        raise ValueError(f"{field} is required")
+    return _intern(s, field)
+
+class Transaction(Freezable):
+    # amount and fee are integer atoms; to_dict/from_dict use decimal strings.
+    # Slotted: a mempool holds many of these. Addresses and keys are interned,
+    # so a busy sender's txs share one copy of each.
+    __slots__ = ('sender_addr', 'recipient_addr', 'amount', 'nonce', 'fee', 'new_account_addr',
+                 'signature', 'public_key', '_frozen', '_cache', '_message', '_txid')
+
+    def __init__(self, sender_addr, recipient_addr, amount, nonce, fee=DEFAULT_FEE, new_account_addr=None, signature=None,public_key=None):
+        self._init_slots()
+        self.sender_addr = _address(sender_addr, 'sender_addr')
+        self.recipient_addr = _address(recipient_addr, 'recipient_addr')
+        self.amount = check_atoms(amount, 'amount')
+        self.nonce = _u64(nonce, 'nonce')
+        self.fee = check_atoms(fee, 'fee')
+        self.new_account_addr = _intern(new_account_addr)
+        self.signature = _signature(signature)
+        self.public_key = _intern(public_key, 'public_key')
+
+    def _init_slots(self):
+        object.__setattr__(self, '_frozen', False)
+        for slot in ('_cache', '_message', '_txid'):
+            object.__setattr__(self, slot, None)
+
+    def _once(self, slot, compute):
+        # Like _cached(), but in a slot of its own for the forms every tx needs
+        value = getattr(self, slot)
+        if value is None:
+            value = compute()
+            if self._frozen:
+                object.__setattr__(self, slot, value)
+        return value
+
+    def accounts(self):
+        """Addresses this tx reads or writes (its conflict/journal set)."""
+        return [a for a in (self.sender_addr, self.recipient_addr, self.new_account_addr) if a]
+
+    def credits(self):
+        """[(address, atoms)] paid out by this tx."""
+        return [(self.recipient_addr, self.amount)]
+
+    def new_accounts(self):
+        """Addresses this tx creates (each pays ACCOUNT_CREATION_FEE)."""
+        return [self.new_account_addr] if self.new_account_addr else []
 
     def to_dict(self):
+        return self._cached('dict', self._to_dict)
+
+    def _to_dict(self):
         return {
             'sender_addr': self.sender_addr,
             'recipient_addr': self.recipient_addr,
-            'amount': str(self.amount),
+            'amount': format_atoms(self.amount),
             'nonce': self.nonce,
+            'fee': format_atoms(self.fee),
             'new_account_addr': self.new_account_addr,
             'signature': self.signature.hex() if self.signature else None,
             'public_key': self.public_key
@@ -33,37 +209,147 @@ class Transaction:
         return cls(
             d['sender_addr'],
             d['recipient_addr'],
-            d['amount'],
+            to_atoms(d['amount']),
             d['nonce'],
-            Decimal(d.get('fee', "0.0001")),
+            to_atoms(d.get('fee', "0.0001")),
             d['new_account_addr'],
             sig,
             d.get('public_key')                      # <-- Add here!
         )
 
     def sign(self, priv_key):
-        self.signature = priv_key.sign(self.message_bytes(), self._sig_algo())
+        self.signature = priv_key.sign(self.message_bytes(), SIG_ALGO)
 
-    def verify_signature(self):
-        # Decode public key (DER, as stored)
-        pub_key_bytes = base64.b64decode(self.public_key)
-        pub_key = serialization.load_der_public_key(pub_key_bytes)
-        pub_key.verify(self.signature, self.message_bytes(), self._sig_algo())
+    def verify_signature(self, public_key=None):
+        # Base64 DER key carried by the tx, else the sender's registered key
+        # (see Ledger.pubkeys); parsed keys come from an LRU cache
+        pub_key = parse_public_key(self.public_key or public_key)
+        pub_key.verify(self.signature, self.message_bytes(), SIG_ALGO)
         return True
 
-    def _sig_algo(self):
-        from cryptography.hazmat.primitives.asymmetric import ec
-        from cryptography.hazmat.primitives import hashes
-        return ec.ECDSA(hashes.SHA256())
-
     def message_bytes(self):
-        import json
-        msg = json.dumps({
+        return self._once('_message', self._message_bytes)
+
+    def _message_bytes(self):
+        # Canonical signed body: everything except the signature and public key
+        return b''.join([
+            codec.u8(codec.CODEC_VERSION),
+            codec.var_str(self.sender_addr),
+            codec.var_str(self.recipient_addr),
+            codec.u64(self.amount),
+            codec.u64(self.nonce),
+            codec.u64(self.fee),
+            codec.var_str(self.new_account_addr),
+        ])
+
+    def to_bytes(self):
+        # Not cached: only the txid and block encoding need it, and both are
+        # cheap to rebuild from the cached message bytes
+        pub = base64.b64decode(self.public_key) if self.public_key else None
+        return self.message_bytes() + codec.var_bytes(self.signature) + codec.var_bytes(pub)
+
+    @classmethod
+    def from_bytes(cls, data):
+        r = codec.Reader(data)
+        r.version()
+        sender, recipient = r.var_str(), r.var_str()
+        amount, nonce, fee = r.u64(), r.u64(), r.u64()
+        new_account_addr = r.var_str()
+        signature, pub = r.var_bytes(), r.var_bytes()
+        r.done()
+        return cls(sender, recipient, amount, nonce, fee, new_account_addr, signature,
+                   base64.b64encode(pub).decode() if pub else None)
+
+    def txid(self):
+        # Hash of the full encoding, signature and public key included
+        return self._once('_txid', lambda: hashlib.sha256(self.to_bytes()).hexdigest())
+
+def _output(addr, amount, new=False):
+    return _address(addr, 'output address'), check_atoms(amount, 'amount'), bool(new)
+
+class BatchTransaction(Transaction):
+    """
+    One sender paying many recipients under a single nonce, fee and
+    signature; the ledger applies all outputs or none. outputs holds
+    (address, atoms, new) tuples, where new marks an account the batch
+    creates. amount is the total paid out. Encodings are tagged with
+    BATCH_TX_TAG, so a batch signature can never pass as a Transaction's.
+    """
+    __slots__ = ('outputs',)
+
+    def __init__(self, sender_addr, outputs, nonce, fee=DEFAULT_FEE, signature=None, public_key=None):
+        self._init_slots()
+        self.sender_addr = _address(sender_addr, 'sender_addr')
+        self.recipient_addr = self.new_account_addr = None
+        self.outputs = tuple(_output(*o) for o in outputs)
+        self.amount = sum(amount for _, amount, _ in self.outputs)
+        self.nonce = _u64(nonce, 'nonce')
+        self.fee = check_atoms(fee, 'fee')
+        self.signature = _signature(signature)
+        self.public_key = _intern(public_key, 'public_key')
+
+    def accounts(self):
+        return [self.sender_addr] + [addr for addr, _, _ in self.outputs]
+
+    def credits(self):
+        return [(addr, amount) for addr, amount, _ in self.outputs]
+
+    def new_accounts(self):
+        return [addr for addr, _, new in self.outputs if new]
+
+    def _to_dict(self):
+        return {
+            'type': 'batch',
             'sender_addr': self.sender_addr,
-            'recipient_addr': self.recipient_addr,
-            'amount': str(self.amount),
+            'outputs': [{'addr': addr, 'amount': format_atoms(amount), 'new': new} for addr, amount, new in self.outputs],
             'nonce': self.nonce,
-            'fee': str(self.fee),
-            'new_account_addr': self.new_account_addr,
-        }, sort_keys=True).encode()
-        return msg
\ No newline at end of file
+            'fee': format_atoms(self.fee),
+            'signature': self.signature.hex() if self.signature else None,
+            'public_key': self.public_key
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        outputs = [(o['addr'], to_atoms(o['amount']), o.get('new', False)) for o in d['outputs']]
+        sig = bytes.fromhex(d['signature']) if d['signature'] else None
+        return cls(d['sender_addr'], outputs, d['nonce'], to_atoms(d.get('fee', "0.0001")), sig, d.get('public_key'))
+
+    def _message_bytes(self):
+        parts = [
+            codec.u8(BATCH_TX_TAG),
+            codec.u8(codec.CODEC_VERSION),
+            codec.var_str(self.sender_addr),
+            codec.u64(self.nonce),
+            codec.u64(self.fee),
+            codec.u32(len(self.outputs)),
+        ]
+        for addr, amount, new in self.outputs:
+            parts += [codec.var_str(addr), codec.u64(amount), codec.u8(new)]
+        return b''.join(parts)
+
+    @classmethod
+    def from_bytes(cls, data):
+        r = codec.Reader(data)
+        if r.u8() != BATCH_TX_TAG:
+            raise codec.CodecError("Not a batch transaction")
+        r.version()
+        sender = r.var_str()
+        nonce, fee = r.u64(), r.u64()
+        count = r.u32()
+        if count > MAX_BATCH_OUTPUTS:
+            raise codec.CodecError(f"Batch has {count} outputs, more than {MAX_BATCH_OUTPUTS}")
+        outputs = [(r.var_str(), r.u64(), r.u8()) for _ in range(count)]
+        signature, pub = r.var_bytes(), r.var_bytes()
+        r.done()
+        return cls(sender, outputs, nonce, fee, signature, base64.b64encode(pub).decode() if pub else None)
+
+def tx_from_bytes(data):
+    """Transaction or BatchTransaction, whichever data encodes."""
+    if data[0] == BATCH_TX_TAG:
+        return BatchTransaction.from_bytes(data)
+    return Transaction.from_bytes(data)
+
+def tx_from_dict(d):
+    if d.get('type') == 'batch':
+        return BatchTransaction.from_dict(d)
+    return Transaction.from_dict(d)
@@ -3,6 +3,8 @@
 import click
 import requests
 import json
+import csv
+from decimal import Decimal
 import sys
 import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -35,9 +37,9 @@ def list(keyring):
 @cli.command()
 @click.argument('from_addr')
 @click.argument('to_addr')
-@click.argument('amount', type=float)
+@click.argument('amount', type=str)
 @click.option('--password', prompt=True, hide_input=True, help='Password to unlock the sending account.')
-@click.option('--fee', type=float, default=0.0001)
+@click.option('--fee', type=str, default='0.0001', show_default=True)
 @click.option('--keyring', default='wallet.keys', show_default=True, help='Path to keyring file')
 def send(from_addr, to_addr, amount, fee, keyring, password):
     """Send a payment."""
@@ -66,6 +68,31 @@ def send(from_addr, to_addr, amount, fee, keyring, password):
     print(f"Transaction sent, TXID: {txid}")
     return txid
 
+@cli.command()
+@click.argument('from_addr')
+@click.argument('payouts', type=click.File('r'))
+@click.option('--password', prompt=True, hide_input=True, help='Password to unlock the sending account.')
+@click.option('--fee', type=str, default=None, help='Total fee (default: 0.0001 per output)')
+@click.option('--keyring', default='wallet.keys', show_default=True, help='Path to keyring file')
+def sendmany(from_addr, payouts, fee, keyring, password):
+    """Pay every line of PAYOUTS (address,amount[,new]) in one batch transaction."""
+    wallet = TallyWallet(keyring)
+    node_rpc = SimpleNodeRPC('http://127.0.0.1:5000')
+    outputs = []
+    for row in csv.reader(payouts):
+        if row:
+            outputs.append((row[0].strip(), row[1].strip(), len(row) > 2 and row[2].strip().lower() in ('1', 'new', 'true')))
+    try:
+        private_key = wallet.get_private_key(from_addr, password)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return
+    fee = fee or str(Decimal('0.0001') * len(outputs))
+    tx = wallet.tx_builder.build_batch_transaction(from_addr, outputs, fee, private_key)
+    result = node_rpc.send_transaction(tx)
+    print(f"Batch of {len(outputs)} payments sent: {result}")
+    return result
+
 class SimpleNodeRPC:  # A basic class to interact with the node
     def __init__(self, base_url):
         self.base_url = base_url
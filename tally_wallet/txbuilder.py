@@ -1,31 +1,56 @@
 # tally_wallet/txbuilder.py
 import requests
-from tally.transaction import Transaction
+from tally.transaction import Transaction, BatchTransaction
+from tally.amount import to_atoms
 import base64
 
 class TransactionBuilder:
     def __init__(self, keyring):
         self.keyring = keyring
 
+    def _sender_state(self, from_addr, node_url):
+        # (pending nonce, public key to include or None once the node has it registered)
+        resp = requests.get(f"{node_url}/nonce/{from_addr}?pending=1")
+        resp.raise_for_status()
+        key_resp = requests.get(f"{node_url}/pubkey/{from_addr}")
+        key_resp.raise_for_status()
+        registered = key_resp.json()["registered"]
+        return resp.json()["nonce"], None if registered else self.keyring.keys[from_addr]["public_key"]
+
+    def build_batch_transaction(self, from_addr, outputs, fee, private_key, node_url='http://127.0.0.1:5000'):
+        """
+        Build and sign one BatchTransaction paying every (address, amount,
+        new) in outputs; amounts and fee are in tally. new marks an address
+        the batch creates (charged ACCOUNT_CREATION_FEE).
+        """
+        nonce, pubkey_b64 = self._sender_state(from_addr, node_url)
+        tx = BatchTransaction(
+            sender_addr=from_addr,
+            outputs=[(addr, to_atoms(amount), new) for addr, amount, new in outputs],
+            nonce=nonce,
+            fee=to_atoms(fee),
+            public_key=pubkey_b64
+        )
+        tx.sign(private_key)
+        return tx
+
     def build_transaction(self, from_addr, to_addr, amount, fee, password, private_key, node_url='http://127.0.0.1:5000'):
         """
         Build and sign an account-based transaction.
-        Fetch the current nonce from the node.
+        Fetch the sender's pending nonce from the node, so txs already
+        waiting in its mempool are counted. The public key is left out once
+        the node has it registered for the sender. amount and fee are in tally
+        (str/Decimal/float) and converted to atoms here.
         """
-        # Fetch the nonce from the node
-        nonce_url = f"{node_url}/nonce/{from_addr}"
-        resp = requests.get(nonce_url)
-        resp.raise_for_status()
-        nonce = resp.json()["nonce"]
+        nonce, pubkey_b64 = self._sender_state(from_addr, node_url)
 
         # Build transaction with only the allowed fields
-        pubkey_b64 = self.keyring.keys[from_addr]["public_key"]
         tx = Transaction(
             sender_addr=from_addr,
             recipient_addr=to_addr,
-            amount=amount,
+            amount=to_atoms(amount),
             nonce=nonce,
-            fee=fee,
+            fee=to_atoms(fee),
             public_key=pubkey_b64,
             new_account_addr=None
         )
@@ -0,0 +1,39 @@
+import base64
+import pytest
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.hazmat.primitives import serialization
+from tally.transaction import Transaction, BatchTransaction
+from tally.amount import to_atoms
+
+@pytest.fixture
+def keys():
+    """sender address -> (private key, base64 DER public key), created on first use."""
+    cache = {}
+    def get(sender):
+        if sender not in cache:
+            priv = ec.generate_private_key(ec.SECP256R1())
+            der = priv.public_key().public_bytes(serialization.Encoding.DER, serialization.PublicFormat.SubjectPublicKeyInfo)
+            cache[sender] = (priv, base64.b64encode(der).decode())
+        return cache[sender]
+    return get
+
+@pytest.fixture
+def make_tx(keys):
+    """Factory for signed transactions (amounts in tally); one key per sender address."""
+    def make(sender, recipient, amount, nonce, fee="0.0001", new_account_addr=None):
+        priv, pub = keys(sender)
+        tx = Transaction(sender, recipient, to_atoms(amount), nonce, to_atoms(fee), new_account_addr, public_key=pub)
+        tx.sign(priv)
+        return tx
+    return make
+
+@pytest.fixture
+def make_batch(keys):
+    """Factory for signed batch transactions; outputs are (address, tally[, new])."""
+    def make(sender, outputs, nonce, fee=None):
+        priv, pub = keys(sender)
+        fee = to_atoms(fee) if fee else to_atoms("0.0001") * len(outputs)
+        tx = BatchTransaction(sender, [(o[0], to_atoms(o[1]), *o[2:]) for o in outputs], nonce, fee, public_key=pub)
+        tx.sign(priv)
+        return tx
+    return make
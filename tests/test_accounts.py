@@ -0,0 +1,27 @@
+from tally.accounts import AccountTable
+from tally.ledger import Ledger
+
+def test_intern_lookup_and_truncate():
+    table = AccountTable()
+    ids = [table.intern(f"addr{i}") for i in range(100)]
+    assert ids == list(range(100))
+    assert table.intern("addr42") == 42
+    assert table.lookup("nobody") is None
+    table.balance[7] = 500
+    assert table.address(7) == "addr7" and table.top('balance', 1) == [("addr7", 500)]
+    table.truncate(50)
+    assert len(table) == 50 and table.lookup("addr60") is None and table.lookup("addr49") == 49
+    assert table.intern("addr60") == 50
+
+def test_ledger_views_keep_dict_api():
+    ledger = Ledger({'alice': 10, 'bob': 30})
+    assert 'alice' in ledger.balances and 'carol' not in ledger.nonces
+    assert dict(ledger.balances) == {'alice': 10, 'bob': 30}
+    ledger.stake('bob', 5)
+    assert dict(ledger.stakes) == {'bob': 5}
+    ledger.unstake('bob', 5)
+    assert 'bob' not in ledger.stakes and len(ledger.stakes) == 0
+    assert ledger.rich_list(1) == [('bob', 30)]
+    copy = ledger.clone()
+    copy.balances['alice'] = 0
+    assert ledger.balances['alice'] == 10
@@ -0,0 +1,51 @@
+import threading
+import pytest
+from tally.ledger import Ledger
+from tally.mempool import Mempool
+from tally.admission import AdmissionPipeline
+from tally.amount import to_atoms
+
+@pytest.fixture(params=[1, 2])
+def pipeline(request):
+    mempool = Mempool(Ledger({f's{i}': to_atoms(10) for i in range(40)}))
+    admitted = []
+    p = AdmissionPipeline(mempool, threading.RLock(), on_admit=admitted.append,
+                          workers=request.param, max_wait=0.05)
+    p.admitted = admitted
+    yield p
+    p.close()
+
+def test_batch_admits_in_arrival_order(pipeline, make_tx):
+    txs = [make_tx(f's{i}', 's0', '1', n) for i in range(1, 20) for n in range(2)]
+    futures = [pipeline.submit_async(tx) for tx in txs]
+    assert all(f.result(5) for f in futures)
+    assert pipeline.admitted == txs
+    assert len(pipeline.mempool) == len(txs)
+    assert pipeline.batches < len(txs)
+
+def test_bad_signature_and_state_rejected(pipeline, make_tx):
+    forged = make_tx('s1', 's0', '1', 0)
+    other = make_tx('s2', 's0', '1', 0)
+    forged.signature = other.signature
+    assert not pipeline.submit(forged)
+    assert not pipeline.submit(make_tx('s3', 's0', '1', 5))  # nonce gap
+    good = make_tx('s3', 's0', '1', 0)
+    assert pipeline.submit(good)
+    assert pipeline.admitted == [good]
+
+def test_malformed_tx_is_rejected_alone(pipeline, make_tx):
+    honest = [make_tx(f's{i}', 's0', '1', 0) for i in range(1, 4)]
+    bad = make_tx('s5', 's0', '1', 0)
+    bad.amount = 2**70  # past u64; the constructor refuses this, a later assignment does not
+    futures = [pipeline.submit_async(tx) for tx in honest[:2] + [bad] + honest[2:]]
+    assert [f.result(5) for f in futures] == [True, True, False, True]
+
+def test_lone_tx_does_not_wait_for_a_batch(make_tx):
+    import time
+    p = AdmissionPipeline(Mempool(Ledger({'s1': to_atoms(10)})), threading.RLock(), workers=1, max_wait=2.0)
+    try:
+        start = time.monotonic()
+        assert p.submit(make_tx('s1', 's0', '1', 0))
+        assert time.monotonic() - start < 1.0
+    finally:
+        p.close()
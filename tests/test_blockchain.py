@@ -1,5 +1,11 @@
 import pytest
-from tally.blockchain import Block, make_genesis_block
+import base64
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.hazmat.primitives import serialization
+from tally.blockchain import Block, make_genesis_block, mine_block, verify_block, compute_merkle_root, search_nonce
+from tally.ledger import Ledger
+from tally.transaction import Transaction
+from tally.amount import to_atoms
 
 def test_block_hash_consistency():
     block = Block(1, '0'*64, [], 1710000001, 0)
@@ -10,4 +16,60 @@ def test_block_hash_consistency():
 def test_genesis_block():
     genesis = make_genesis_block()
     assert genesis.index == 0
-    assert genesis.prev_hash == '0' * 64
\ No newline at end of file
+    assert genesis.prev_hash == '0' * 64
+
+def _signed_tx(priv, pub_b64, sender, recipient, amount, nonce):
+    tx = Transaction(sender, recipient, to_atoms(amount), nonce, public_key=pub_b64)
+    tx.sign(priv)
+    return tx
+
+def _keypair():
+    priv = ec.generate_private_key(ec.SECP256R1())
+    der = priv.public_key().public_bytes(serialization.Encoding.DER, serialization.PublicFormat.SubjectPublicKeyInfo)
+    return priv, base64.b64encode(der).decode()
+
+def test_header_hash_commits_to_txs_through_merkle_root():
+    priv, pub = _keypair()
+    txs = [_signed_tx(priv, pub, 'alice', 'bob', '0.1', n) for n in range(3)]
+    block = Block(1, '0'*64, txs, 1710000001, 0)
+    assert block.merkle_root == compute_merkle_root(txs)
+    assert set(block.header()) == {'index', 'prev_hash', 'merkle_root', 'state_root', 'timestamp', 'nonce'}
+    h = block.compute_hash()
+    block.txs = txs[:2]
+    assert block.compute_hash() == h  # header unchanged...
+    assert compute_merkle_root(block.txs) != block.merkle_root  # ...but the body no longer matches it
+
+def test_verify_block_rejects_tampered_body():
+    priv, pub = _keypair()
+    ledger = Ledger({'alice': to_atoms(10)})
+    txs = [_signed_tx(priv, pub, 'alice', 'bob', '0.1', n) for n in range(2)]
+    view = ledger.overlay()
+    assert all(view.execute_transaction(tx) for tx in txs)
+    block = mine_block(Block(1, '0'*64, txs, 1710000001, 0, state_root=view.state_root()), difficulty=1)
+    assert verify_block(block, '0'*64, ledger, difficulty=1)
+    tampered = Block(1, '0'*64, [txs[1], txs[0]], block.timestamp, block.nonce, block.hash, block.merkle_root, block.state_root)
+    assert not verify_block(tampered, '0'*64, ledger, difficulty=1)
+    wrong_state = mine_block(Block(1, '0'*64, txs, 1710000001, 0, state_root=ledger.state_root()), difficulty=1)
+    assert not verify_block(wrong_state, '0'*64, ledger, difficulty=1)
+
+def test_mined_block_is_frozen_and_cached():
+    priv, pub = _keypair()
+    block = mine_block(Block(1, '0'*64, [_signed_tx(priv, pub, 'alice', 'bob', '0.1', 0)], 1710000001, 0), difficulty=1)
+    with pytest.raises(AttributeError):
+        block.nonce += 1
+    with pytest.raises(AttributeError):
+        block.txs[0].amount = 5
+    assert block.to_dict() is block.to_dict()
+    assert block.to_json() is block.to_json()
+    assert block.txs[0].txid() is block.txs[0].txid()
+    assert Block.from_dict(block.to_dict())._frozen
+
+def test_midstate_search_matches_compute_hash():
+    block = Block(1, '0'*64, [], 1710000001, 0)
+    assert block.header_bytes().endswith((0).to_bytes(8, 'big'))
+    nonce, h = search_nonce(block.header_prefix(), 2, 0, 100000)
+    block.nonce = nonce
+    assert block.compute_hash() == h and h.startswith('00')
+    block.nonce = 0
+    mined = mine_block(block, difficulty=2)
+    assert (mined.nonce, mined.hash) == (nonce, h)
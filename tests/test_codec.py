@@ -0,0 +1,43 @@
+import base64
+import pytest
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.hazmat.primitives import serialization
+from tally.blockchain import Block, mine_block
+from tally.codec import CodecError
+from tally.storage import BlockStore
+from tally.transaction import Transaction
+from tally.amount import to_atoms
+
+def _signed_tx(nonce=0, new_account_addr=None):
+    priv = ec.generate_private_key(ec.SECP256R1())
+    der = priv.public_key().public_bytes(serialization.Encoding.DER, serialization.PublicFormat.SubjectPublicKeyInfo)
+    tx = Transaction('alice', 'bob', to_atoms('0.25'), nonce, to_atoms('0.0002'), new_account_addr, public_key=base64.b64encode(der).decode())
+    tx.sign(priv)
+    return tx
+
+def test_transaction_bytes_roundtrip():
+    tx = _signed_tx(new_account_addr='bob')
+    data = tx.to_bytes()
+    tx2 = Transaction.from_bytes(data)
+    assert tx2.to_dict() == tx.to_dict()
+    assert tx2.to_bytes() == data
+    assert tx2.txid() == tx.txid()
+    assert tx2.verify_signature()
+    assert len(data) < len(str(tx.to_dict()))
+
+def test_block_bytes_roundtrip_and_store(tmp_path):
+    block = mine_block(Block(1, '0'*64, [_signed_tx(0), _signed_tx(1)], 1710000001, 0), difficulty=1)
+    block2 = Block.from_bytes(block.to_bytes())
+    assert block2.to_dict() == block.to_dict()
+    assert block2.compute_hash() == block.hash
+    store = BlockStore(str(tmp_path / 'chain.dat'))
+    store.append(block)
+    store.append(block2)
+    assert [b.hash for b in store.load()] == [block.hash, block.hash]
+
+def test_truncated_bytes_rejected():
+    data = _signed_tx().to_bytes()
+    with pytest.raises(CodecError):
+        Transaction.from_bytes(data[:-3])
+    with pytest.raises(CodecError):
+        Transaction.from_bytes(data + b'\x00')
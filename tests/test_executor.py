@@ -0,0 +1,93 @@
+import pytest
+from tally.ledger import Ledger
+from tally.blockchain import Block
+from tally.executor import ParallelExecutor, conflict_groups
+from tally.amount import to_atoms
+
+@pytest.fixture(scope='module')
+def executor():
+    ex = ParallelExecutor(workers=2, min_txs=1)
+    yield ex
+    ex.close()
+
+def _block(make_tx, bad=False):
+    txs = []
+    for i in range(6):
+        txs.append(make_tx(f's{i}', f'r{i}', '1', 0, new_account_addr=f'r{i}'))
+    txs.append(make_tx('s0', 's1', '2', 1))  # joins the s0 and s1 groups
+    txs.append(make_tx('s2', 'r3', '1', 1))
+    if bad:
+        txs.append(make_tx('s4', 'r4', '100', 1))  # overspends
+    return Block(1, '0'*64, txs, 1710000001)
+
+def test_conflict_groups(make_tx):
+    groups = conflict_groups(_block(make_tx).txs)
+    assert groups == [[0, 1, 6], [2, 3, 7], [4], [5]]
+
+def test_parallel_matches_sequential(make_tx, executor):
+    block = _block(make_tx)
+    sequential = Ledger({f's{i}': to_atoms(10) for i in range(6)})
+    parallel = sequential.clone()
+    parallel.executor = executor
+    assert sequential.apply_block(block)
+    assert parallel.apply_block(block)
+    for col in ('balance', 'nonce', 'stake'):
+        assert getattr(parallel.accounts, col) == getattr(sequential.accounts, col)
+    assert list(parallel.accounts.addresses()) == list(sequential.accounts.addresses())
+    assert parallel.fee_collected == sequential.fee_collected
+    assert parallel.circulating == sequential.circulating
+    assert parallel.state_root() == sequential.state_root()
+    assert parallel.audit()
+    parallel.rollback_to(0)
+    assert len(parallel.accounts) == 6
+
+def test_parallel_failure_leaves_ledger_untouched(make_tx, executor):
+    ledger = Ledger({f's{i}': to_atoms(10) for i in range(6)})
+    root = ledger.state_root()
+    ledger.executor = executor
+    assert not ledger.apply_block(_block(make_tx, bad=True))
+    assert ledger.height == 0 and len(ledger.accounts) == 6
+    assert ledger.state_root() == root
+
+def test_parallel_batch_matches_sequential(make_tx, make_batch, executor):
+    txs = [make_batch('s0', [('s1', '1'), ('n0', '1', True), ('n1', '1', True)], 0)]
+    txs += [make_tx(f's{i}', f'r{i}', '1', 0, new_account_addr=f'r{i}') for i in range(2, 6)]
+    txs.append(make_batch('s2', [('n1', '1'), ('r3', '1')], 1))  # joins the s0 and s2/s3 groups
+    block = Block(1, '0'*64, txs, 1710000001)
+    assert len(conflict_groups(txs)) == 3
+    sequential = Ledger({f's{i}': to_atoms(10) for i in range(6)})
+    parallel = sequential.clone()
+    parallel.executor = executor
+    assert sequential.apply_block(block) and parallel.apply_block(block)
+    assert list(parallel.accounts.addresses()) == list(sequential.accounts.addresses())
+    assert parallel.state_root() == sequential.state_root()
+    assert parallel.audit()
+
+def test_account_created_in_the_block_can_send(make_tx, executor):
+    txs = [make_tx('s0', 'n0', '5', 0, new_account_addr='n0'), make_tx('n0', 's0', '1', 0), make_tx('s1', 'r1', '1', 0)]
+    block = Block(1, '0'*64, txs, 1710000001)
+    sequential = Ledger({'s0': to_atoms(10), 's1': to_atoms(10), 'r1': 0})
+    parallel = sequential.clone()
+    parallel.executor = executor
+    assert sequential.apply_block(block) and parallel.apply_block(block)
+    assert dict(parallel.balances) == dict(sequential.balances)
+    assert dict(parallel.pubkeys) == dict(sequential.pubkeys) and 'n0' in parallel.pubkeys
+    assert parallel.state_root() == sequential.state_root()
+    assert parallel.audit()
+
+
+def test_workers_skip_signatures_the_parent_checked(make_tx, monkeypatch):
+    from tally.transaction import Transaction, sig_cache
+    from tally.executor import checked_signatures, _execute_chunk
+    first = make_tx('s0', 'r0', '1', 0)
+    keyless = make_tx('s0', 'r0', '1', 1)
+    keyless.public_key = None  # verified against the key first registers
+    txs = [first, keyless]
+    checked = checked_signatures(Ledger({'s0': to_atoms(10)}), txs)
+    assert checked == {0: None, 1: first.public_key}
+    sig_cache.clear()  # as in a fresh worker process
+    monkeypatch.setattr(Transaction, 'verify_signature', lambda self, public_key=None: 1 / 0)
+    state, fees, registered = _execute_chunk({'s0': (to_atoms(10), 0, None)}, txs, checked)
+    assert state['s0'][1] == 2 and registered == {'s0': first.public_key}
+    sig_cache.clear()
+    assert _execute_chunk({'s0': (to_atoms(10), 0, None)}, txs) is None  # unchecked, so verified (and here, failed)
@@ -0,0 +1,143 @@
+import pytest
+from tally.blockchain import Block
+from tally.ledger import Ledger, UndoRecord, ACCOUNT_CREATION_FEE, MIN_TX_FEE, MIN_NEW_ACCOUNT_AMOUNT
+from tally.amount import to_atoms, format_atoms
+
+def test_running_totals_track_transfers_and_stakes(make_tx):
+    ledger = Ledger({'alice': to_atoms(10), 'bob': to_atoms(5)})
+    assert ledger.execute_transaction(make_tx('alice', 'bob', '1', 0))
+    assert ledger.execute_transaction(make_tx('alice', 'carol', '0.5', 1, new_account_addr='carol'))
+    ledger.stake('bob', to_atoms('2'))
+    assert ledger.circulating == sum(ledger.balances.values())
+    assert ledger.staked == to_atoms('2')
+    assert ledger.fee_collected == to_atoms('0.0002') + ACCOUNT_CREATION_FEE
+    assert ledger.audit()
+    # a transfer after staking used to trip the old sum-based invariant
+    assert ledger.execute_transaction(make_tx('bob', 'alice', '1', 0))
+
+def test_audit_detects_drift_and_runs_every_n_blocks(make_tx):
+    ledger = Ledger({'alice': to_atoms(10)}, audit_interval=2)
+    assert ledger.apply_block(Block(1, '0'*64, [make_tx('alice', 'bob', '1', 0)], 1710000001))
+    ledger.balances['bob'] += 1  # corrupt state behind the running totals
+    with pytest.raises(Exception, match="Supply invariant"):
+        ledger.apply_block(Block(2, '0'*64, [], 1710000002))
+
+def test_overlay_commit_and_discard(make_tx):
+    ledger = Ledger({'alice': to_atoms(10), 'bob': to_atoms(5)})
+    ledger.stake('bob', to_atoms('1'))
+    view = ledger.overlay()
+    assert view.execute_transaction(make_tx('alice', 'carol', '2', 0, new_account_addr='carol'))
+    view.unstake('bob', to_atoms('1'))
+    assert set(view.balances.local) == {'alice', 'carol'} | {'bob'}
+    assert 'carol' not in ledger.balances and ledger.stakes == {'bob': to_atoms('1')}
+    view.discard()
+    assert view.balances['alice'] == to_atoms(10) and 'bob' in view.stakes
+    assert view.execute_transaction(make_tx('alice', 'carol', '2', 0, new_account_addr='carol'))
+    view.unstake('bob', to_atoms('1'))
+    view.commit()
+    assert ledger.balances['carol'] == to_atoms(2) and ledger.nonces['alice'] == 1
+    assert ledger.stakes == {} and ledger.audit()
+    for call in (lambda: view.apply_block(None), view.clone, view.rich_list, lambda: view.prove('alice'),
+                 lambda: view.rollback_to(0)):
+        with pytest.raises(TypeError, match='read-through'):
+            call()
+
+def test_clone_keeps_stakes():
+    ledger = Ledger({'bob': to_atoms(5)})
+    ledger.stake('bob', to_atoms('1'))
+    assert ledger.clone().stakes == {'bob': to_atoms('1')}
+
+def test_fee_constants_are_exact_atoms():
+    assert (ACCOUNT_CREATION_FEE, MIN_TX_FEE, MIN_NEW_ACCOUNT_AMOUNT) == (10**7, 10**6, 1)
+    assert format_atoms(to_atoms('1000.0000000001')) == '1000.0000000001'
+    with pytest.raises(ValueError):
+        to_atoms('0.00000000001')
+    with pytest.raises(ValueError):
+        to_atoms('1.00000000000000000000000000001')  # more digits than the default Decimal context keeps
+    assert to_atoms('1.5000000000000000000000000000000') == to_atoms('1.5')
+    assert to_atoms(format_atoms(2**64 - 1)) == 2**64 - 1
+
+def test_rollback_unwinds_blocks_and_created_accounts(make_tx):
+    ledger = Ledger({'alice': to_atoms(10), 'bob': to_atoms(5)})
+    before = (dict(ledger.balances), dict(ledger.nonces), ledger.fee_collected, len(ledger.accounts))
+    b1 = Block(1, '0'*64, [make_tx('alice', 'bob', '1', 0), make_tx('alice', 'carol', '1', 1, new_account_addr='carol')], 1710000001)
+    b2 = Block(2, '0'*64, [make_tx('bob', 'dave', '2', 0)], 1710000002)
+    assert ledger.apply_block(b1) and ledger.apply_block(b2)
+    assert ledger.height == 2 and ledger.undo_log[0].created == ['carol']
+    ledger.rollback_to(0)
+    assert (dict(ledger.balances), dict(ledger.nonces), ledger.fee_collected, len(ledger.accounts)) == before
+    assert ledger.audit() and ledger.height == 0
+    with pytest.raises(ValueError):
+        ledger.rollback_to(-1)
+    assert ledger.apply_block(b1)
+    undo = ledger.undo_log[-1]
+    assert UndoRecord.from_bytes(undo.to_bytes()).__dict__ == undo.__dict__
+
+def test_apply_block_is_atomic(make_tx):
+    ledger = Ledger({'alice': to_atoms(10)})
+    bad = Block(1, '0'*64, [make_tx('alice', 'bob', '1', 0), make_tx('alice', 'bob', '1', 5)], 1710000001)
+    assert not ledger.apply_block(bad)
+    assert dict(ledger.balances) == {'alice': to_atoms(10)} and ledger.fee_collected == 0
+
+def test_apply_block_unwinds_when_a_tx_raises(make_tx):
+    import pytest
+    ledger = Ledger({'alice': to_atoms(10)})
+    txs = [make_tx('alice', 'bob', '1', 0), make_tx('alice', 'carol', '1', 1, new_account_addr='carol')]
+    execute = ledger.execute_transaction
+    def flaky(tx):
+        if tx is txs[1]:
+            raise RuntimeError("boom")
+        return execute(tx)
+    ledger.execute_transaction = flaky
+    with pytest.raises(RuntimeError):
+        ledger.apply_block(Block(1, '0'*64, txs, 1710000001))
+    assert dict(ledger.balances) == {'alice': to_atoms(10)} and dict(ledger.nonces) == {'alice': 0}
+    assert ledger.height == 0 and ledger.undo_log == [] and 'alice' not in ledger.pubkeys
+    assert ledger.audit()
+
+def test_pubkey_registry_lets_later_txs_omit_the_key(make_tx):
+    ledger = Ledger({'alice': to_atoms(10), 'mallory': to_atoms(10)})
+    first = make_tx('alice', 'bob', '1', 0)
+    keyless = make_tx('alice', 'bob', '1', 1)
+    keyless.public_key = None  # the signature does not cover the key
+    assert not ledger.validate_transaction(keyless)  # nothing registered yet
+    assert ledger.apply_block(Block(1, '0'*64, [first], 1710000001))
+    assert ledger.pubkeys['alice'] == first.public_key
+    assert len(keyless.to_bytes()) < len(first.to_bytes())
+    assert ledger.validate_transaction(keyless)
+    forged = make_tx('mallory', 'bob', '1', 0)
+    forged.sender_addr = 'alice'
+    forged.nonce = 1
+    assert not ledger.validate_transaction(forged)  # signed with a different key
+    assert ledger.apply_block(Block(2, '0'*64, [keyless], 1710000002))
+    ledger.rollback_to(0)
+    assert 'alice' not in ledger.pubkeys
+    assert ledger.undo_log == []
+
+def test_batch_transaction_pays_every_output_or_none(make_tx, make_batch):
+    ledger = Ledger({'alice': to_atoms(100), 'bob': to_atoms(5)})
+    batch = make_batch('alice', [('bob', '1'), ('carol', '2', True), ('dave', '3', True)], 0)
+    assert ledger.apply_block(Block(1, '0'*64, [batch], 1710000001))
+    assert ledger.balances['bob'] == to_atoms(6)
+    assert ledger.balances['carol'] == to_atoms(2) and ledger.nonces['dave'] == 0
+    assert ledger.nonces['alice'] == 1
+    assert ledger.fee_collected == 3 * MIN_TX_FEE + 2 * ACCOUNT_CREATION_FEE
+    assert ledger.balances['alice'] == to_atoms(94) - ledger.fee_collected
+    assert ledger.undo_log[-1].created == ['carol', 'dave'] and ledger.audit()
+    assert not ledger.validate_transaction(make_batch('alice', [('bob', '1'), ('erin', '1')], 1))  # erin not flagged new
+    assert not ledger.validate_transaction(make_batch('alice', [('bob', '1'), ('bob', '1')], 1))
+    assert not ledger.validate_transaction(make_batch('alice', [('bob', '1'), ('carol', '1')], 1, fee='0.0001'))
+    assert not ledger.validate_transaction(make_batch('alice', [('bob', '1'), ('carol', '1', True)], 1))  # exists
+    overspend = make_batch('alice', [('bob', '1'), ('carol', '100')], 1)
+    before = dict(ledger.balances)
+    assert not ledger.apply_block(Block(2, '0'*64, [make_tx('bob', 'carol', '1', 0), overspend], 1710000002))
+    assert dict(ledger.balances) == before
+    ledger.rollback_to(0)
+    assert dict(ledger.balances) == {'alice': to_atoms(100), 'bob': to_atoms(5)}
+
+def test_initial_balances_must_be_atoms():
+    from decimal import Decimal
+    with pytest.raises(TypeError):
+        Ledger({'alice': Decimal('1.5')})
+    with pytest.raises(ValueError):
+        Ledger({'alice': -1})
@@ -0,0 +1,107 @@
+from tally.ledger import Ledger, ACCOUNT_CREATION_FEE
+from tally.blockchain import Block
+from tally.mempool import Mempool
+from tally.amount import to_atoms
+
+def _ledger():
+    return Ledger({'alice': to_atoms(10), 'bob': to_atoms(10), 'carol': to_atoms(10)})
+
+def test_select_orders_by_fee_rate_and_nonce(make_tx):
+    pool = Mempool(_ledger())
+    a0 = make_tx('alice', 'bob', '1', 0, fee='0.001')
+    a1 = make_tx('alice', 'bob', '1', 1, fee='0.01')
+    b0 = make_tx('bob', 'carol', '1', 0, fee='0.005')
+    for tx in (a0, a1, b0):
+        assert pool.add(tx)
+    assert not pool.add(a0)  # duplicate
+    assert not pool.add(make_tx('alice', 'bob', '1', 5))  # nonce gap
+    # a1 pays most but cannot go before a0
+    assert list(pool.select()) == [b0, a0, a1]
+    assert len(pool) == 3
+
+def test_cap_evicts_cheapest_tail(make_tx):
+    pool = Mempool(_ledger(), max_txs=2)
+    a0 = make_tx('alice', 'bob', '1', 0, fee='0.001')
+    a1 = make_tx('alice', 'bob', '1', 1, fee='0.0001')
+    b0 = make_tx('bob', 'carol', '1', 0, fee='0.002')
+    assert pool.add(a0) and pool.add(a1)
+    assert pool.add(b0)  # pushes out a1, the cheapest tail
+    assert a1.txid() not in pool and pool.pending.nonce('alice') == 1
+    assert not pool.add(make_tx('carol', 'bob', '1', 0, fee='0.0001'))  # too cheap to fit
+    assert len(pool) == 2
+
+def test_expiry_and_confirmation(make_tx):
+    ledger = _ledger()
+    pool = Mempool(ledger, expiry=60)
+    a0 = make_tx('alice', 'bob', '1', 0)
+    a1 = make_tx('alice', 'bob', '1', 1)
+    b0 = make_tx('bob', 'carol', '1', 0)
+    assert pool.add(a0, now=100) and pool.add(b0, now=100) and pool.add(a1, now=200)
+    assert ledger.apply_block(Block(1, '0'*64, [a0], 1710000001))
+    pool.remove_confirmed([a0])
+    assert list(pool) == [b0, a1]
+    assert pool.pending.nonce('alice') == 2
+    assert pool.expire(now=200) == 1  # b0
+    assert list(pool) == [a1]
+
+def test_replace_by_fee(make_tx):
+    pool = Mempool(_ledger(), min_bump=0.5)
+    a0 = make_tx('alice', 'bob', '1', 0, fee='0.001')
+    a1 = make_tx('alice', 'bob', '1', 1, fee='0.001')
+    assert pool.add(a0) and pool.add(a1)
+    assert not pool.add(make_tx('alice', 'carol', '1', 0, fee='0.0012'))  # bump too small
+    assert not pool.add(make_tx('alice', 'carol', '9', 0, fee='0.002'))  # queue no longer affordable
+    r0 = make_tx('alice', 'carol', '1', 0, fee='0.002')
+    assert pool.add(r0)
+    assert a0.txid() not in pool and pool.stats()['replacements'] == 1
+    assert list(pool.select()) == [r0, a1]
+    assert pool.pending.balance('alice') == to_atoms(10) - to_atoms(2) - to_atoms('0.003')
+
+def test_post_block_maintenance_only_drops_invalidated_txs(make_tx):
+    ledger = _ledger()
+    ledger.balances['frank'] = to_atoms(10)
+    ledger.total_supply += to_atoms(10)
+    ledger.circulating += to_atoms(10)
+    pool = Mempool(ledger)
+    a0 = make_tx('alice', 'bob', '1', 0)
+    a1 = make_tx('alice', 'bob', '4', 1)
+    a2 = make_tx('alice', 'bob', '4', 2)
+    b0 = make_tx('bob', 'dave', '1', 0, new_account_addr='dave')
+    f0 = make_tx('frank', 'bob', '1', 0)
+    for tx in (a0, a1, a2, b0, f0):
+        assert pool.add(tx)
+    # Mined elsewhere: a0 plus txs the pool never saw, which leave alice short and create dave
+    other = [make_tx('alice', 'erin', '5.5', 1, new_account_addr='erin'),
+             make_tx('carol', 'dave', '1', 0, new_account_addr='dave')]
+    assert ledger.apply_block(Block(1, '0'*64, [a0] + other, 1710000001))
+    pool.remove_confirmed([a0] + other)
+    # a1's nonce is taken, a2 is no longer affordable, b0 would recreate dave
+    assert list(pool) == [f0]
+    assert pool.pending.queued == {'frank': [1, f0.amount + f0.fee]}
+    assert pool.bytes == len(f0.to_bytes())
+
+def test_batch_is_one_entry_and_dropped_when_its_new_account_appears(make_tx, make_batch):
+    ledger = _ledger()
+    pool = Mempool(ledger)
+    batch = make_batch('alice', [('bob', '1'), ('dave', '1', True), ('erin', '1', True)], 0)
+    assert pool.add(batch)
+    assert len(pool) == 1 and set(pool.creating) == {'dave', 'erin'}
+    assert pool.pending.balance('alice') == to_atoms(7) - batch.fee - 2 * ACCOUNT_CREATION_FEE
+    block = Block(1, '0'*64, [make_tx('bob', 'erin', '1', 0, new_account_addr='erin')], 1710000001)
+    assert ledger.apply_block(block)
+    pool.remove_confirmed(block.txs)
+    assert len(pool) == 0 and not pool.creating
+
+def test_tx_without_recipient_is_refused_at_admission(make_tx):
+    import pytest
+    from tally.transaction import tx_from_dict
+    ledger = Ledger({'alice': to_atoms(10)})
+    pool = Mempool(ledger)
+    tx = make_tx('alice', 'bob', '1', 0)
+    d = tx.to_dict()
+    d['recipient_addr'] = None
+    with pytest.raises(ValueError):
+        tx_from_dict(d)  # what /sendtx does with the request body
+    tx.recipient_addr = None  # not frozen yet, so still settable
+    assert not pool.add(tx) and len(pool) == 0
+    assert ledger.balances['alice'] == to_atoms(10)
@@ -0,0 +1,86 @@
+import threading
+from tally.blockchain import Block
+from tally.miner import ParallelMiner
+
+def test_parallel_miner_finds_valid_nonce():
+    miner = ParallelMiner(workers=2, chunk_size=500)
+    block = miner.mine(Block(1, '0'*64, [], 1710000001, 0), difficulty=3)
+    assert block is not None
+    assert block.hash == block.compute_hash()
+    assert block.hash.startswith('000')
+
+def test_cancel_stale_stops_running_job():
+    miner = ParallelMiner(workers=2, chunk_size=500)
+    block = Block(1, 'a'*64, [], 1710000001, 0)
+    timer = threading.Timer(0.3, miner.cancel_stale, args=('b'*64,))
+    timer.start()
+    assert miner.mine(block, difficulty=64) is None
+    assert block.hash is None
+
+def test_mining_service_publishes_block(make_tx):
+    import time
+    from tally.ledger import Ledger
+    from tally.blockchain import make_genesis_block
+    from tally.mempool import Mempool
+    from tally.template import BlockTemplateBuilder
+    from tally.miner import MiningService
+    from tally.amount import to_atoms
+    ledger = Ledger({'alice': to_atoms(10)})
+    chain = [make_genesis_block(ledger)]
+    pool = Mempool(ledger)
+    assert pool.add(make_tx('alice', 'bob', '1', 0))
+    def publish(block):
+        assert ledger.apply_block(block)
+        chain.append(block)
+        pool.remove_confirmed(block.txs)
+        return True
+    service = MiningService(ParallelMiner(workers=1), BlockTemplateBuilder(pool, ledger),
+                            lambda: chain[-1], publish, threading.RLock(), difficulty=1)
+    job = service.submit()
+    for _ in range(200):
+        if service.status(job)['status'] in ('mined', 'failed'):
+            break
+        time.sleep(0.01)
+    status = service.status(job)
+    assert status['status'] == 'mined' and status['block']['hash'] == chain[-1].hash
+    assert len(chain) == 2 and len(pool) == 0
+    failed = service.submit()  # nothing left to mine
+    for _ in range(200):
+        if service.status(failed)['status'] == 'failed':
+            break
+        time.sleep(0.01)
+    assert service.status(failed)['error'] == 'no valid tx'
+
+def test_work_cache_validates_submitted_nonce(make_tx):
+    from tally.ledger import Ledger
+    from tally.blockchain import make_genesis_block, search_nonce
+    from tally.mempool import Mempool
+    from tally.template import BlockTemplateBuilder
+    from tally.miner import WorkCache
+    from tally.amount import to_atoms
+    ledger = Ledger({'alice': to_atoms(10)})
+    chain = [make_genesis_block(ledger)]
+    pool = Mempool(ledger)
+    assert pool.add(make_tx('alice', 'bob', '1', 0))
+    published = [True]
+    def publish(block):
+        if not published[-1]:
+            return False
+        assert ledger.apply_block(block)
+        chain.append(block)
+        pool.remove_confirmed(block.txs)
+        return True
+    cache = WorkCache(BlockTemplateBuilder(pool, ledger), lambda: chain[-1], publish, threading.RLock(), difficulty=2)
+    work = cache.get_work(now=0)
+    assert cache.get_work(now=1)['work_id'] == work['work_id']  # cached
+    nonce, _ = search_nonce(bytes.fromhex(work['prefix']), 2, 0, 10**6)
+    bad = next(n for n in range(10**6) if search_nonce(bytes.fromhex(work['prefix']), 2, n, 1) is None)
+    assert cache.submit(work['work_id'], bad) is None
+    block = cache.submit(work['work_id'], nonce)
+    assert block is chain[-1] and block.hash == block.compute_hash()
+    assert cache.submit(work['work_id'], nonce) is None  # already used
+    assert pool.add(make_tx('alice', 'bob', '1', 1))
+    work = cache.get_work(now=2)
+    published.append(False)  # e.g. the solved block fails verify_block
+    nonce, _ = search_nonce(bytes.fromhex(work['prefix']), 2, 0, 10**6)
+    assert cache.submit(work['work_id'], nonce) is None and len(chain) == 2
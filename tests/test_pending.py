@@ -0,0 +1,21 @@
+from tally.ledger import Ledger
+from tally.pending import PendingState
+from tally.amount import to_atoms
+
+def test_sender_can_queue_sequential_nonces(make_tx):
+    ledger = Ledger({'alice': to_atoms(10), 'bob': to_atoms(1)})
+    pending = PendingState(ledger)
+    txs = [make_tx('alice', 'bob', '2', n) for n in range(4)]
+    assert all(pending.add(tx) for tx in txs)
+    assert pending.nonce('alice') == 4
+    assert ledger.nonces['alice'] == 0  # confirmed state untouched
+    assert not pending.add(make_tx('alice', 'bob', '1', 6))  # gap
+    assert not pending.add(make_tx('alice', 'bob', '2', 4))  # only ~2 left after queued spends
+    assert pending.balance('bob') == to_atoms(1)  # incoming pending transfers don't count
+
+    pending.remove(txs[3])
+    assert pending.nonce('alice') == 3
+    for tx in reversed(txs[:3]):
+        pending.remove(tx)
+    assert pending.queued == {}
+    assert pending.balance('alice') == to_atoms(10)
@@ -0,0 +1,84 @@
+from tally.ledger import Ledger
+from tally.blockchain import Block
+from tally.snapshot import write_snapshot, load_snapshot
+from tally.amount import to_atoms
+
+def test_snapshot_round_trip_is_lazy(tmp_path):
+    path = str(tmp_path / 'ledger.snap')
+    ledger = Ledger({f'addr{i}': to_atoms(i + 1) for i in range(200)})
+    ledger.stake('addr7', to_atoms(3))
+    write_snapshot(path, ledger, 'ab' * 32)
+    loaded, snap = load_snapshot(path)
+    assert snap.height == 0 and snap.block_hash == 'ab' * 32
+    assert len(loaded.accounts) == 0  # nothing interned until used
+    assert loaded.balances['addr42'] == to_atoms(43)
+    assert loaded.stakes['addr7'] == to_atoms(3)
+    assert 'missing' not in loaded.balances
+    assert len(loaded.accounts) == 2
+    assert loaded.state_root() == ledger.state_root() == snap.state_root
+    assert len(loaded.accounts) == 2  # the tree comes from the file, not a rehash
+    assert dict(loaded.balances) == dict(ledger.balances)
+    assert loaded.audit()
+
+def test_replay_after_snapshot_matches_full_ledger(tmp_path, make_tx):
+    path = str(tmp_path / 'ledger.snap')
+    ledger = Ledger({'alice': to_atoms(10), 'bob': to_atoms(5)})
+    assert ledger.apply_block(Block(1, '0'*64, [make_tx('alice', 'bob', '1', 0)], 1710000001))
+    write_snapshot(path, ledger, '11' * 32)
+    block = Block(2, '11'*64, [make_tx('bob', 'carol', '2', 0, new_account_addr='carol')], 1710000002)
+    assert ledger.apply_block(block)
+    loaded, _ = load_snapshot(path)
+    assert loaded.height == 1
+    assert loaded.apply_block(block)
+    assert loaded.height == 2
+    assert loaded.state_root() == ledger.state_root()
+    loaded.rollback_to(1)
+    assert 'carol' not in loaded.balances
+    assert loaded.balances['bob'] == to_atoms(6)
+    assert loaded.pubkeys['alice'] == ledger.pubkeys['alice']  # registered before the snapshot
+    assert 'bob' not in loaded.pubkeys
+
+def test_rollback_past_snapshot_with_stored_undo(tmp_path, make_tx):
+    from tally.storage import BlockStore
+    path = str(tmp_path / 'ledger.snap')
+    store = BlockStore(str(tmp_path / 'chain.dat'))
+    ledger = Ledger({'alice': to_atoms(10), 'bob': to_atoms(5)})
+    root = ledger.state_root()
+    block = Block(1, '0'*64, [make_tx('alice', 'carol', '2', 0, new_account_addr='carol')], 1710000001)
+    assert ledger.apply_block(block)
+    store.append(block, ledger.undo_log[-1])
+    write_snapshot(path, ledger, '11' * 32)
+    loaded, _ = load_snapshot(path)
+    loaded.undo_log = store.load_undo()
+    assert loaded.undo_log[0].height == 0
+    loaded.rollback_to(0)
+    assert 'carol' not in loaded.balances and 'carol' not in list(loaded.balances)
+    assert 'alice' not in loaded.pubkeys and len(loaded.pubkeys) == 0
+    assert loaded.balances['alice'] == to_atoms(10)
+    assert loaded.state_root() == root
+
+
+def test_snapshot_with_bad_state_tree_is_rejected(tmp_path):
+    import pytest
+    from tally.statetree import RECORD_SIZE
+    path = str(tmp_path / 'ledger.snap')
+    write_snapshot(path, Ledger({'alice': to_atoms(1), 'bob': to_atoms(2)}), 'ab' * 32)
+    with open(path, 'r+b') as f:
+        f.seek(-RECORD_SIZE + 1, 2)
+        f.write(b'\xff')  # first byte of the root hash
+    with pytest.raises(ValueError):
+        load_snapshot(path)
+
+def test_ledger_can_switch_to_the_written_state_tree(tmp_path, make_tx):
+    from tally.snapshot import Snapshot
+    path = str(tmp_path / 'ledger.snap')
+    balances = {f'addr{i}': to_atoms(1) for i in range(50)}
+    balances['alice'] = to_atoms(10)
+    ledger = Ledger(balances)
+    write_snapshot(path, ledger, 'ab' * 32)
+    full = ledger.clone()
+    ledger.state = Snapshot(path).state_tree()
+    block = Block(1, '0'*64, [make_tx('alice', 'carol', '2', 0, new_account_addr='carol')], 1710000001)
+    assert ledger.apply_block(block) and full.apply_block(block)
+    assert ledger.state_root() == full.state_root()
+    assert ledger.prove('carol') == full.prove('carol')
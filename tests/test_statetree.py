@@ -0,0 +1,57 @@
+import pytest
+from tally.ledger import Ledger
+from tally.blockchain import Block
+from tally.statetree import StateTree, EMPTY_ROOT, RECORD_SIZE, account_leaf, verify_proof
+from tally.amount import to_atoms
+
+def test_root_is_order_independent_and_removal_restores_it():
+    a, b = StateTree(), StateTree()
+    for i in range(50):
+        a.set(f"addr{i}", account_leaf(f"addr{i}", i, 0, 0))
+    for i in reversed(range(50)):
+        b.set(f"addr{i}", account_leaf(f"addr{i}", i, 0, 0))
+    assert a.root() == b.root() != EMPTY_ROOT
+    snapshot = a.copy()
+    a.set("extra", account_leaf("extra", 1, 0, 0))
+    assert a.root() != snapshot.root()
+    a.remove("extra")
+    assert a.root() == snapshot.root()
+    for i in range(50):
+        a.remove(f"addr{i}")
+    assert a.root() == EMPTY_ROOT
+
+def test_ledger_root_tracks_blocks_and_proofs(make_tx):
+    ledger = Ledger({'alice': to_atoms(10), 'bob': to_atoms(5)})
+    genesis_root = ledger.state_root()
+    view = ledger.overlay()
+    tx = make_tx('alice', 'carol', '1', 0, new_account_addr='carol')
+    assert view.execute_transaction(tx)
+    speculative = view.state_root()
+    assert ledger.state_root() == genesis_root
+    assert ledger.apply_block(Block(1, '0'*64, [tx], 1710000001))
+    assert ledger.state_root() == speculative
+    root, value, siblings = ledger.prove('carol')
+    assert value == account_leaf('carol', to_atoms(1), 0, 0)
+    assert verify_proof(root, 'carol', value, siblings)
+    assert not verify_proof(root, 'carol', account_leaf('carol', to_atoms(2), 0, 0), siblings)
+    ledger.rollback_to(0)
+    assert ledger.state_root() == genesis_root
+
+def test_stored_tree_matches_the_in_memory_one():
+    tree = StateTree()
+    for i in range(50):
+        tree.set(f"addr{i}", account_leaf(f"addr{i}", i, 0, 0))
+    buf = b''.join(tree.records())
+    stored = StateTree.load(buf, 0, len(buf) // RECORD_SIZE)
+    assert stored.root() == tree.root()
+    assert stored.prove('addr7') == tree.prove('addr7')
+    for t in (tree, stored):
+        t.remove('addr3')
+        t.set('addr9', account_leaf('addr9', 1, 1, 0))
+        t.set('new', account_leaf('new', 1, 0, 0))
+    assert stored.root() == tree.root()
+    assert StateTree.load(b'', 0, 0).root() == EMPTY_ROOT
+    bad = bytearray(buf)
+    bad[40] ^= 1  # key of the first leaf record
+    with pytest.raises(ValueError):
+        list(StateTree.load(bytes(bad), 0, len(bad) // RECORD_SIZE).records())  # reads every node
@@ -0,0 +1,31 @@
+from tally.ledger import Ledger
+from tally.blockchain import make_genesis_block, BLOCK_OVERHEAD
+from tally.mempool import Mempool
+from tally.template import BlockTemplateBuilder
+from tally.amount import to_atoms
+
+def _setup(make_tx):
+    ledger = Ledger({'alice': to_atoms(10), 'bob': to_atoms(10)})
+    pool = Mempool(ledger)
+    a = [make_tx('alice', 'carol', '1', n, fee='0.002') for n in range(3)]
+    b = [make_tx('bob', 'carol', '1', n, fee='0.001') for n in range(3)]
+    for tx in a + b:
+        assert pool.add(tx)
+    return ledger, pool, a, b
+
+def test_template_respects_tx_cap_and_state_root(make_tx):
+    ledger, pool, a, b = _setup(make_tx)
+    genesis = make_genesis_block(ledger)
+    block = BlockTemplateBuilder(pool, ledger, max_txs=4).build(genesis)
+    assert list(block.txs) == a + b[:1]
+    assert block.index == 1 and block.prev_hash == genesis.hash
+    assert ledger.apply_block(block)
+    assert ledger.state_root() == block.state_root
+
+def test_template_byte_cap_skips_rest_of_sender(make_tx):
+    ledger, pool, a, b = _setup(make_tx)
+    tx_size = 4 + len(a[0].to_bytes())
+    builder = BlockTemplateBuilder(pool, ledger, max_bytes=BLOCK_OVERHEAD + 2 * tx_size + tx_size // 2)
+    block = builder.build(make_genesis_block(ledger))
+    assert len(block.to_bytes()) <= builder.max_bytes
+    assert list(block.txs) == a[:2]
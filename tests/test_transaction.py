@@ -1,9 +1,101 @@
 import pytest
 from tally.crypto import gen_keypair
 from tally.transaction import Transaction
+from tally.amount import to_atoms
+
 
 def test_transaction_sign_and_verify():
     priv, pub, addr = gen_keypair()
-    tx = Transaction(addr, addr, 0.1, 0)
+    tx = Transaction(addr, addr, to_atoms('0.1'), 0)
     tx.sign(priv)
-    assert tx.verify_signature()
\ No newline at end of file
+    assert tx.verify_signature()
+
+
+def test_signature_cache_verifies_each_tx_once(make_tx, monkeypatch):
+    from tally.transaction import SignatureCache
+    calls = []
+    real = Transaction.verify_signature
+    monkeypatch.setattr(Transaction, 'verify_signature', lambda self, public_key=None: calls.append(1) or real(self, public_key))
+    cache = SignatureCache(size=2)
+    txs = [make_tx('alice', 'bob', '1', n) for n in range(3)]
+    assert cache.verify(txs[0]) and cache.verify(txs[0])
+    assert len(calls) == 1 and cache.hits == 1
+    cache.verify(txs[1]); cache.verify(txs[2])  # txs[0] falls out
+    assert len(cache) == 2
+    cache.verify(txs[0])
+    assert len(calls) == 4
+    tampered = make_tx('alice', 'bob', '1', 0)
+    tampered.amount = to_atoms('2')  # new txid, so no stale hit
+    with pytest.raises(Exception):
+        cache.verify(tampered)
+
+
+def test_signature_cache_is_thread_safe(make_tx, monkeypatch):
+    import sys, threading
+    from tally.transaction import SignatureCache
+    monkeypatch.setattr(Transaction, 'verify_signature', lambda self, public_key=None: True)
+    cache = SignatureCache(size=2)  # constant eviction
+    txs = [make_tx('alice', 'bob', '1', n).freeze() for n in range(8)]
+    errors = []
+    def hammer():
+        try:
+            for n in range(5000):
+                cache.verify(txs[n % 8]) if n % 3 else cache.record(txs[n % 8])
+        except Exception as e:
+            errors.append(e)
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)  # switch threads as often as possible
+    threads = [threading.Thread(target=hammer) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    sys.setswitchinterval(interval)
+    assert errors == [] and len(cache) == 2
+
+def test_frozen_tx_is_slotted_and_caches_its_hashes(make_tx):
+    import pickle
+    tx = make_tx('alice', 'bob', '1', 0)
+    assert not hasattr(tx, '__dict__')
+    before = tx.txid()
+    tx.nonce = 1  # still mutable, nothing cached yet
+    assert tx.txid() != before
+    tx.nonce = 0
+    tx.freeze()
+    assert tx.txid() is tx.txid() and tx.message_bytes() is tx.message_bytes()
+    with pytest.raises(AttributeError):
+        tx.amount = 0
+    copy = pickle.loads(pickle.dumps(tx))
+    assert copy.txid() == tx.txid() and copy.verify_signature()
+    with pytest.raises(AttributeError):
+        copy.fee = 0
+
+
+def test_batch_transaction_round_trips_and_signs_its_own_encoding(make_batch):
+    from tally.transaction import BatchTransaction, BATCH_TX_TAG, tx_from_bytes, tx_from_dict
+    from tally.blockchain import Block
+    batch = make_batch('alice', [('bob', '1'), ('carol', '0.5', True)], 3).freeze()
+    assert batch.amount == to_atoms('1.5') and batch.new_accounts() == ['carol']
+    assert batch.to_bytes()[0] == BATCH_TX_TAG
+    for copy in (tx_from_bytes(batch.to_bytes()), tx_from_dict(batch.to_dict())):
+        assert isinstance(copy, BatchTransaction)
+        assert copy.txid() == batch.txid() and copy.outputs == batch.outputs
+        assert copy.verify_signature()
+    block = Block(1, '0'*64, [batch], 1710000001)
+    assert Block.from_bytes(block.to_bytes()).txs[0].txid() == batch.txid()
+    tampered = tx_from_dict(batch.to_dict())
+    tampered.outputs = (('mallory',) + batch.outputs[0][1:],) + batch.outputs[1:]
+    with pytest.raises(Exception):
+        tampered.verify_signature()
+
+
+def test_unencodable_fields_are_refused_on_construction():
+    for kwargs in ({'amount': -1}, {'amount': 2**64}, {'nonce': -1}, {'nonce': '1'}, {'sender_addr': 'a' * 70000},
+                   {'recipient_addr': None}, {'recipient_addr': ''}, {'sender_addr': 7}):
+        args = dict(sender_addr='alice', recipient_addr='bob', amount=1, nonce=0)
+        args.update(kwargs)
+        with pytest.raises((TypeError, ValueError)):
+            Transaction(**args)
+    with pytest.raises(ValueError):
+        Transaction.from_dict({'sender_addr': 'alice', 'recipient_addr': 'bob', 'amount': '-1', 'nonce': 0,
+                               'new_account_addr': None, 'signature': None})